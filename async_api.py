@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional, Union
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import compress
+import conversion
+from image_processor import ImageProcessor
+from encoding_profiles import DEFAULT_PROFILE, CONVERT_DEFAULT_PROFILE
+
+# API assíncrona: as funções abaixo rodam o trabalho em um executor
+# compartilhado e devolvem um iterador assíncrono de eventos tipados, em vez de
+# mensagens de log formatadas.
+
+@dataclass(frozen=True)
+class Started:
+    operation: str
+    total: int
+
+@dataclass(frozen=True)
+class FileDone:
+    path: str
+    seconds: float
+    input_bytes: int
+    output_bytes: int
+
+@dataclass(frozen=True)
+class FileFailed:
+    path: str
+    error: str
+
+@dataclass(frozen=True)
+class Finished:
+    operation: str
+    succeeded: int
+    failed: int
+    seconds: float
+
+ProgressEvent = Union[Started, FileDone, FileFailed, Finished]
+
+_shared_executor = None
+
+def get_executor() -> Executor:
+    """Executor compartilhado por todos os trabalhos assíncronos."""
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix='nextsmart')
+    return _shared_executor
+
+def set_executor(executor: Executor):
+    """Substitui o executor compartilhado (por exemplo, por um ProcessPoolExecutor)."""
+    global _shared_executor
+    _shared_executor = executor
+
+def _compress_task(file_path, output_directory, png_quantize, dither, effort, diet):
+    start = time.perf_counter()
+    os.makedirs(output_directory, exist_ok=True)
+    output_file_path = compress.compress_file(file_path, output_directory, png_quantize, dither, effort, diet)
+    return [FileDone(file_path, time.perf_counter() - start, os.path.getsize(file_path),
+                     os.path.getsize(output_file_path))]
+
+def _convert_task(file_path, output_directory, output_format, effort, diet):
+    start = time.perf_counter()
+    output_file_path = conversion.convert_file(file_path, output_directory, output_format, effort, diet)
+    return [FileDone(file_path, time.perf_counter() - start, os.path.getsize(file_path),
+                     os.path.getsize(output_file_path))]
+
+def _slice_task(files, output_path, width, slice_height, output_format, quality, effort, output_mode, incremental,
+                diet):
+    # Um processador por pasta: os contadores não são compartilhados entre threads
+    processor = ImageProcessor(logging.getLogger(__name__))
+    processor.quality = quality
+    processor.effort = effort
+    processor.diet = diet
+
+    start = time.perf_counter()
+    written = processor.process_folder(files, output_path, width, slice_height, output_format, output_mode,
+                                       incremental=incremental)
+    seconds = time.perf_counter() - start
+
+    failed = set(processor.failed_images)
+    events = [FileFailed(str(file), "Falha ao processar a imagem") for file in processor.failed_images]
+    if processor.failure_count > len(failed):
+        events.append(FileFailed(str(output_path), "Falha ao salvar imagem"))
+    if written:
+        events.append(FileDone(
+            str(output_path), seconds,
+            sum(os.path.getsize(file) for file in files if file not in failed),
+            sum(os.path.getsize(file) for file in written)
+        ))
+    return events
+
+async def _run(operation, tasks, executor, max_pending) -> AsyncIterator[ProgressEvent]:
+    """Executa as tarefas com no máximo `max_pending` em andamento, emitindo os eventos."""
+    loop = asyncio.get_running_loop()
+    executor = executor or get_executor()
+    max_pending = max_pending or 2 * (os.cpu_count() or 4)
+
+    yield Started(operation, len(tasks))
+    start = time.perf_counter()
+    succeeded = failed = 0
+    pending = {}
+    iterator = iter(tasks)
+
+    try:
+        while True:
+            while len(pending) < max_pending:
+                try:
+                    path, func, args = next(iterator)
+                except StopIteration:
+                    break
+                pending[loop.run_in_executor(executor, func, *args)] = path
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    events = future.result()
+                except Exception as e:
+                    events = [FileFailed(path, str(e))]
+                for event in events:
+                    if isinstance(event, FileDone):
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    yield event
+    finally:
+        # Encerramento antecipado do iterador: cancela o que ainda não começou
+        for future in pending:
+            future.cancel()
+
+    yield Finished(operation, succeeded, failed, time.perf_counter() - start)
+
+async def process_directory_recursive_async(base_directory: str, png_quantize: bool = False, dither: bool = True,
+                                            effort: str = DEFAULT_PROFILE, diet: Optional[str] = None,
+                                            executor: Optional[Executor] = None,
+                                            max_pending: Optional[int] = None) -> AsyncIterator[ProgressEvent]:
+    """Versão assíncrona de `compress.process_directory_recursive`."""
+    base_directory = base_directory.strip('"')
+    if not os.path.exists(base_directory):
+        raise FileNotFoundError(f"O diretório '{base_directory}' não existe.")
+
+    tasks = []
+    for root, _, files in os.walk(base_directory):
+        output_base_directory = os.path.join(base_directory + "-optimized", os.path.relpath(root, base_directory))
+        for filename in files:
+            if filename.lower().endswith(compress.SUPPORTED_FORMATS):
+                file_path = os.path.join(root, filename)
+                tasks.append((file_path, _compress_task,
+                              (file_path, output_base_directory, png_quantize, dither, effort, diet)))
+
+    async for event in _run('compress', tasks, executor, max_pending):
+        yield event
+
+async def convert_images_async(directory: str, output_format: str = 'jpeg', effort: str = CONVERT_DEFAULT_PROFILE,
+                               diet: Optional[str] = None, executor: Optional[Executor] = None,
+                               max_pending: Optional[int] = None) -> AsyncIterator[ProgressEvent]:
+    """Versão assíncrona de `conversion.convert_images`."""
+    directory = directory.strip('"')
+    if not os.path.exists(directory):
+        raise FileNotFoundError(f"O diretório '{directory}' não existe.")
+
+    output_base_directory = directory + "-converted"
+    tasks = []
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.lower().endswith(conversion.SUPPORTED_FORMATS):
+                file_path = os.path.join(root, filename)
+                tasks.append((file_path, _convert_task, (file_path, output_base_directory, output_format, effort, diet)))
+
+    async for event in _run('convert', tasks, executor, max_pending):
+        yield event
+
+async def process_images_async(input_folder: str, output_folder: str, width: int, slice_height: int,
+                               output_format: Optional[str] = None, quality: int = 85,
+                               effort: str = DEFAULT_PROFILE, output_mode: str = 'files',
+                               incremental: bool = False, diet: Optional[str] = None, executor: Optional[Executor] = None,
+                               max_pending: Optional[int] = None) -> AsyncIterator[ProgressEvent]:
+    """
+    Versão assíncrona de `ImageProcessor.process_images`. Cada pasta é uma
+    unidade de trabalho: o `FileDone` traz o caminho da pasta de saída.
+    """
+    images_map = ImageProcessor(logging.getLogger(__name__)).find_image_files(input_folder)
+    tasks = [
+        (str(Path(output_folder) / relative_path), _slice_task,
+         (files, Path(output_folder) / relative_path, width, slice_height, output_format, quality, effort,
+          output_mode, incremental, diet))
+        for relative_path, files in images_map.items()
+    ]
+
+    async for event in _run('slice', tasks, executor, max_pending):
+        yield event
@@ -0,0 +1,223 @@
+import io
+import threading
+from collections import Counter
+from PIL import Image, ImageChops, ImageCms, ImageFilter, ImageOps
+
+# Modo "dieta de bytes": aplica a orientação EXIF na decodificação, mantém ou
+# remove metadados conforme a política, converte para sRGB quando pedido e
+# escolhe a subamostragem de croma do JPEG conforme o conteúdo.
+
+# keep: mantém EXIF (sem a miniatura), XMP e ICC
+# strip: remove EXIF e XMP; mantém o ICC para não alterar as cores
+# srgb: como strip, mas converte os pixels para sRGB e descarta o ICC
+# Em todas, um ICC de outro espaço de cor que não o da saída (CMYK ou cinza
+# gravados em RGB, RGB gravado em cinza) é aplicado aos pixels e descartado.
+DIET_POLICIES = ('keep', 'strip', 'srgb')
+
+# Categorias de metadados medidas em bytes
+METADATA_CATEGORIES = ('exif', 'xmp', 'icc')
+
+# Classificação de conteúdo, feita em uma miniatura
+SAMPLE_SIZE = 512
+GRAY_TOLERANCE = 6          # desvio máximo de Cb/Cr em torno de 128
+GRAY_OUTLIERS = 0.001       # fração de pixels coloridos tolerada
+FLAT_MAX_COLORS = 1024      # poucas cores: interface, texto, arte chapada
+SHARP_BACKGROUND = 4        # mediana das bordas: fundo liso
+SHARP_EDGE_LEVEL = 48       # intensidade de uma borda forte (texto, traço fino)
+SHARP_EDGE_FRACTION = 0.02  # fração mínima de bordas fortes
+
+# Subamostragem por classe de conteúdo ('gray' vira JPEG de um canal)
+CONTENT_SUBSAMPLING = {'flat': '4:4:4', 'sharp': '4:4:4', 'photo': '4:2:0'}
+
+_SRGB_PROFILE = ImageCms.createProfile('sRGB')
+
+def _xmp(img):
+    xmp = img.info.get('xmp') or img.info.get('XML:com.adobe.xmp') or b''
+    return xmp.encode('utf-8') if isinstance(xmp, str) else xmp
+
+def metadata_sizes(img):
+    """Tamanho em bytes de cada categoria de metadados da imagem."""
+    return {
+        'exif': len(img.info.get('exif') or b''),
+        'xmp': len(_xmp(img)),
+        'icc': len(img.info.get('icc_profile') or b''),
+    }
+
+def _profile_space(icc):
+    """Espaço de cor do perfil ICC ('RGB', 'GRAY', 'CMYK', ...); None se ausente ou inválido."""
+    if not icc:
+        return None
+    try:
+        return ImageCms.ImageCmsProfile(io.BytesIO(icc)).profile.xcolor_space.strip()
+    except (ImageCms.PyCMSError, OSError, ValueError):
+        return None
+
+def _output_space(mode, format_):
+    """Espaço de cor em que o codificador grava a imagem no modo dado."""
+    if format_ == 'WEBP':
+        # O WebP grava tudo em RGB/RGBA
+        return 'RGB'
+    if mode in ('1', 'L', 'LA', 'I', 'I;16', 'F'):
+        return 'GRAY'
+    return 'CMYK' if mode == 'CMYK' else 'RGB'
+
+def _to_srgb(img):
+    """Converte os pixels do perfil embutido para sRGB; sem perfil, nada muda."""
+    icc = img.info.get('icc_profile')
+    if not icc:
+        return img
+    info = {key: value for key, value in img.info.items() if key != 'icc_profile'}
+    if img.mode not in ('RGB', 'RGBA', 'CMYK', 'L'):
+        img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+    try:
+        converted = ImageCms.profileToProfile(
+            img, ImageCms.ImageCmsProfile(io.BytesIO(icc)), _SRGB_PROFILE,
+            outputMode='RGBA' if img.mode == 'RGBA' else 'RGB'
+        )
+    except (ImageCms.PyCMSError, OSError, ValueError):
+        # Perfil inválido ou incompatível com o modo: mantém pixels e perfil
+        return img
+    converted.info = info
+    return converted
+
+def _profile_to_srgb(img, space):
+    """Aplica aos pixels um perfil que não combina com a saída, convertendo para sRGB."""
+    if space == 'GRAY' and img.mode != 'L':
+        # Pixels cinza já expandidos para RGB: volta ao canal único que o perfil descreve
+        alpha = img.getchannel('A') if 'A' in img.mode else None
+        img = _to_srgb(img.convert('L'))
+        if alpha is not None:
+            img = img.convert('RGB')
+            img.putalpha(alpha)
+        return img
+    return _to_srgb(img)
+
+def prepare(img, policy):
+    """
+    Etapa de decodificação: aplica a orientação EXIF e, na política srgb,
+    converte para sRGB. Devolve a imagem e os tamanhos originais dos metadados.
+    """
+    original = metadata_sizes(img)
+    img = ImageOps.exif_transpose(img)
+    # Toda saída é RGB: um perfil CMYK precisa ser aplicado antes da conversão ingênua para RGB
+    if policy == 'srgb' or _profile_space(img.info.get('icc_profile')) == 'CMYK':
+        img = _to_srgb(img)
+    return img, original
+
+def classify(img):
+    """Classifica o conteúdo em 'gray', 'flat', 'sharp' ou 'photo'."""
+    # Amostragem por vizinho mais próximo: não mistura cores nem suaviza bordas
+    scale = min(1.0, SAMPLE_SIZE / max(img.size))
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    sample = img.convert('RGB') if scale == 1.0 else img.resize(size, Image.Resampling.NEAREST).convert('RGB')
+    pixels = sample.width * sample.height
+
+    _, cb, cr = sample.convert('YCbCr').split()
+    low, high = 128 - GRAY_TOLERANCE, 128 + GRAY_TOLERANCE + 1
+    colored = max(sum(h[:low]) + sum(h[high:]) for h in (cb.histogram(), cr.histogram()))
+    if colored <= GRAY_OUTLIERS * pixels:
+        return 'gray'
+    if sample.getcolors(FLAT_MAX_COLORS) is not None:
+        return 'flat'
+
+    # Texto e traço: fundo liso com bordas fortes; fotos têm bordas médias em toda parte
+    gray = sample.convert('L')
+    edges = ImageChops.difference(gray, gray.filter(ImageFilter.BoxBlur(1))).histogram()
+    accumulated, median = 0, 0
+    while accumulated + edges[median] <= pixels // 2:
+        accumulated += edges[median]
+        median += 1
+    if median <= SHARP_BACKGROUND and sum(edges[SHARP_EDGE_LEVEL:]) >= SHARP_EDGE_FRACTION * pixels:
+        return 'sharp'
+    return 'photo'
+
+def apply(img, format_, options, policy, original=None, report=None):
+    """
+    Ajusta a imagem e as opções de gravação conforme a política. Os metadados
+    mantidos são passados explicitamente; `report` recebe a economia em bytes
+    por categoria, em relação à gravação sem a dieta, e a classe de conteúdo
+    escolhida para o JPEG.
+    """
+    original = original or metadata_sizes(img)
+    options = dict(options)
+    content = classify(img) if format_ == 'JPEG' else None
+
+    icc = img.info.get('icc_profile') or b''
+    space = _profile_space(icc)
+    if space and space != _output_space('L' if content == 'gray' else img.mode, format_):
+        # O perfil descreveria cores erradas na saída: converte para sRGB e o descarta
+        img = _profile_to_srgb(img, space)
+        icc = b''
+
+    kept = {'exif': b'', 'xmp': b'', 'icc': icc}
+    if policy == 'keep':
+        # A reserialização descarta a miniatura (IFD1) embutida no EXIF
+        kept['exif'] = img.getexif().tobytes() if img.info.get('exif') else b''
+        kept['xmp'] = _xmp(img)
+    img.info = {key: value for key, value in img.info.items()
+                if key not in ('exif', 'xmp', 'XML:com.adobe.xmp', 'icc_profile', 'comment')}
+    written = dict.fromkeys(METADATA_CATEGORIES, 0)
+    if kept['exif'] and format_ in ('JPEG', 'PNG', 'WEBP'):
+        options['exif'] = kept['exif']
+        written['exif'] = len(kept['exif'])
+    if kept['xmp'] and format_ in ('JPEG', 'WEBP'):
+        options['xmp'] = kept['xmp']
+        written['xmp'] = len(kept['xmp'])
+    if kept['icc'] and format_ in ('JPEG', 'PNG', 'WEBP'):
+        options['icc_profile'] = kept['icc']
+        written['icc'] = len(kept['icc'])
+
+    if content == 'gray':
+        # Sem croma: grava um único canal
+        img = img.convert('L')
+        options.pop('subsampling', None)
+    elif content:
+        options['subsampling'] = CONTENT_SUBSAMPLING[content]
+
+    if report is not None:
+        # Sem a dieta, só o PNG grava metadados: o Pillow copia o ICC da imagem.
+        # Valores negativos são bytes acrescentados (EXIF e XMP da política keep).
+        baseline = {'exif': 0, 'xmp': 0, 'icc': original['icc'] if format_ == 'PNG' else 0}
+        for category in METADATA_CATEGORIES:
+            report[category] = report.get(category, 0) + baseline[category] - written[category]
+        if content:
+            report['content'] = content
+    return img, options
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class DietStats:
+    """Acumula, entre threads, a economia por categoria de uma execução."""
+    def __init__(self):
+        self.saved = Counter()
+        self.content = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, report):
+        if not report:
+            return
+        with self._lock:
+            for category in METADATA_CATEGORIES:
+                self.saved[category] += report.get(category, 0)
+            if report.get('content'):
+                self.content[report['content']] += 1
+
+    def summary_lines(self):
+        lines = [
+            f"Dieta de bytes - {category}: {_format_bytes(abs(self.saved[category]))} "
+            f"{'removidos' if self.saved[category] >= 0 else 'adicionados'} em relação à saída sem a dieta"
+            for category in METADATA_CATEGORIES
+        ]
+        if self.content:
+            lines.append(
+                "Dieta de bytes - croma do JPEG: "
+                f"{self.content['gray']} em tons de cinza (1 canal), "
+                f"{self.content['flat'] + self.content['sharp']} em 4:4:4 (texto/arte chapada), "
+                f"{self.content['photo']} em 4:2:0 (fotos)"
+            )
+        return lines
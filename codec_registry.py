@@ -0,0 +1,456 @@
+import os
+import io
+import json
+import time
+import threading
+import PIL
+from PIL import Image
+
+# Registro de decodificadores/codificadores. O Pillow está sempre disponível;
+# backends opcionais (OpenCV, pillow-heif, rawpy) entram quando instalados.
+# Um micro-benchmark na primeira utilização ordena os backends por velocidade
+# para cada formato, e os demais ficam como alternativa em caso de falha.
+# O resultado fica em disco, associado às versões dos backends, para que os
+# processos worker não repitam a medição. NEXTSMART_CODEC_BENCHMARK=0 desliga
+# o benchmark e mantém a ordem de registro.
+
+BENCHMARK_CACHE = os.path.join(os.path.expanduser('~'), '.nextsmart', 'codec-benchmark.json')
+
+class UnsupportedFormatError(Exception):
+    """Nenhum backend instalado decodifica ou codifica o formato pedido."""
+
+# Dicas de instalação para formatos que o Pillow não abre sozinho
+INSTALL_HINTS = {
+    '.heic': 'pip install pillow-heif',
+    '.heif': 'pip install pillow-heif',
+    '.raw': 'pip install rawpy',
+    '.dng': 'pip install rawpy',
+    '.cr2': 'pip install rawpy',
+    '.nef': 'pip install rawpy',
+    '.arw': 'pip install rawpy',
+}
+
+def _extension(source):
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+    return os.path.splitext(str(name))[1].lower()
+
+def _read_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source.read()
+
+class PillowBackend:
+    """Codecs padrão do Pillow (ou de uma build compatível, como o pillow-simd)."""
+    name = 'pillow-simd' if '.post' in PIL.__version__ else 'pillow'
+    version = PIL.__version__
+    keeps_metadata = True
+
+    def available(self):
+        return True
+
+    def decode_extensions(self):
+        return set(Image.registered_extensions())
+
+    def encode_formats(self):
+        return set(Image.SAVE)
+
+    def decode(self, source):
+        return Image.open(source)
+
+    def can_encode(self, img, format_, options):
+        return True
+
+    def encode(self, img, target, format_, **options):
+        img.save(target, format_, **options)
+
+class OpenCVBackend:
+    """
+    imdecode/imencode do OpenCV para JPEG, PNG, BMP e WebP de 8 bits.
+    Não decodifica PNG (perderia paleta e metadados) e só codifica quando
+    consegue respeitar todas as opções pedidas; caso contrário o Pillow assume.
+    """
+    name = 'opencv'
+    # imdecode descarta EXIF, ICC e XMP
+    keeps_metadata = False
+
+    DECODE_EXTENSIONS = {'.jpg', '.jpeg', '.bmp', '.webp'}
+    ENCODE_FORMATS = {'JPEG', 'PNG'}
+    JPEG_OPTIONS = {'quality', 'optimize', 'progressive', 'subsampling'}
+    PNG_OPTIONS = {'compress_level', 'optimize'}
+    # Chaves de `img.info` que o Pillow grava por conta própria e o imencode descartaria
+    CARRIED_INFO = {'JPEG': ('icc_profile', 'comment'), 'PNG': ('icc_profile', 'transparency')}
+
+    def __init__(self):
+        try:
+            import cv2
+            import numpy
+        except ImportError:
+            cv2 = numpy = None
+        self.cv2 = cv2
+        self.numpy = numpy
+        self.version = getattr(cv2, '__version__', None)
+
+    def available(self):
+        return self.cv2 is not None
+
+    def decode_extensions(self):
+        return set(self.DECODE_EXTENSIONS)
+
+    def encode_formats(self):
+        return set(self.ENCODE_FORMATS)
+
+    def decode(self, source):
+        cv2, numpy = self.cv2, self.numpy
+        extension = _extension(source)
+        array = cv2.imdecode(numpy.frombuffer(_read_bytes(source), numpy.uint8), cv2.IMREAD_UNCHANGED)
+        if array is None or array.dtype != numpy.uint8:
+            raise ValueError("OpenCV não conseguiu decodificar a imagem em 8 bits")
+        if array.ndim == 3 and array.shape[2] == 4:
+            array = cv2.cvtColor(array, cv2.COLOR_BGRA2RGBA)
+        elif array.ndim == 3:
+            array = cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
+        img = Image.fromarray(array)
+        # Mantém o formato de origem, usado pela compressão para escolher a saída
+        img.format = Image.registered_extensions().get(extension)
+        return img
+
+    def can_encode(self, img, format_, options):
+        if format_ not in self.ENCODE_FORMATS or img.mode not in ('L', 'RGB', 'RGBA'):
+            return False
+        if any(key in img.info for key in self.CARRIED_INFO[format_]):
+            return False
+        if format_ == 'JPEG':
+            if img.mode == 'RGBA' or not set(options) <= self.JPEG_OPTIONS:
+                return False
+            return options.get('subsampling') in (None, -1, 0, 1, 2, '4:4:4', '4:2:2', '4:2:0')
+        # O `optimize` do PNG no Pillow testa filtros; o OpenCV não tem equivalente
+        return set(options) <= self.PNG_OPTIONS and not options.get('optimize')
+
+    def encode(self, img, target, format_, **options):
+        cv2, numpy = self.cv2, self.numpy
+        array = numpy.asarray(img)
+        if img.mode == 'RGB':
+            array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+        elif img.mode == 'RGBA':
+            array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGRA)
+
+        params = []
+        if format_ == 'JPEG':
+            extension = '.jpg'
+            params += [cv2.IMWRITE_JPEG_QUALITY, int(options.get('quality', 75))]
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, int(bool(options.get('optimize')))]
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(options.get('progressive')))]
+            sampling = {
+                0: '444', '4:4:4': '444', 1: '422', '4:2:2': '422', 2: '420', '4:2:0': '420'
+            }.get(options.get('subsampling'))
+            if sampling and hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR'):
+                params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{sampling}')]
+        else:
+            extension = '.png'
+            params += [cv2.IMWRITE_PNG_COMPRESSION, int(options.get('compress_level', 6))]
+
+        success, encoded = cv2.imencode(extension, array, params)
+        if not success:
+            raise ValueError(f"OpenCV não conseguiu codificar {format_}")
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, 'wb') as f:
+                f.write(encoded.tobytes())
+        else:
+            target.write(encoded.tobytes())
+
+class HeifBackend:
+    """Abre HEIC/HEIF através do plugin pillow-heif."""
+    name = 'pillow-heif'
+    keeps_metadata = True
+
+    def __init__(self):
+        try:
+            import pillow_heif
+            pillow_heif.register_heif_opener()
+            self.loaded = True
+            self.version = getattr(pillow_heif, '__version__', None)
+        except ImportError:
+            self.loaded = False
+            self.version = None
+
+    def available(self):
+        return self.loaded
+
+    def decode_extensions(self):
+        return {'.heic', '.heif'}
+
+    def encode_formats(self):
+        return set()
+
+    def decode(self, source):
+        return Image.open(source)
+
+class RawBackend:
+    """Revela arquivos RAW de câmera com o rawpy (LibRaw)."""
+    name = 'rawpy'
+    keeps_metadata = False
+
+    def __init__(self):
+        try:
+            import rawpy
+        except ImportError:
+            rawpy = None
+        self.rawpy = rawpy
+        self.version = getattr(rawpy, '__version__', None)
+
+    def available(self):
+        return self.rawpy is not None
+
+    def decode_extensions(self):
+        return {'.raw', '.dng', '.cr2', '.nef', '.arw'}
+
+    def encode_formats(self):
+        return set()
+
+    def decode(self, source):
+        if not isinstance(source, (str, os.PathLike)):
+            source = io.BytesIO(_read_bytes(source))
+        with self.rawpy.imread(source) as raw:
+            return Image.fromarray(raw.postprocess())
+
+class CodecRegistry:
+    def __init__(self):
+        self.backends = []
+        self.decoders = {}
+        self.encoders = {}
+        self.benchmark_results = {}
+        self._benchmarked = False
+        self._lock = threading.Lock()
+
+    def register(self, backend):
+        """Registra o backend se as dependências dele estiverem instaladas."""
+        if not backend.available():
+            return False
+        with self._lock:
+            self.backends.append(backend)
+            for extension in backend.decode_extensions():
+                self.decoders.setdefault(extension, []).append(backend)
+            for format_ in backend.encode_formats():
+                self.encoders.setdefault(format_, []).append(backend)
+            self._benchmarked = False
+        return True
+
+    def _sample_image(self):
+        # Gradiente com ruído: evita que formatos sem perdas fiquem triviais
+        gradient = Image.linear_gradient('L')
+        noise = Image.effect_noise(gradient.size, 32)
+        return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_90)))
+
+    def _time(self, func, repeat=3):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def benchmark(self):
+        """Mede cada backend nos formatos em que há mais de uma opção e ordena pelo mais rápido."""
+        sample = self._sample_image()
+        results = {}
+
+        for format_, backends in self.encoders.items():
+            if len(backends) < 2:
+                continue
+            timings = {}
+            for backend in backends:
+                if not backend.can_encode(sample, format_, {}):
+                    continue
+                try:
+                    timings[backend.name] = self._time(lambda: backend.encode(sample, io.BytesIO(), format_))
+                except Exception:
+                    continue
+            if len(timings) > 1:
+                results[('encode', format_)] = timings
+
+        for extension, backends in self.decoders.items():
+            if len(backends) < 2:
+                continue
+            format_ = Image.registered_extensions().get(extension)
+            if format_ not in Image.SAVE:
+                continue
+            data = io.BytesIO()
+            sample.save(data, format_)
+            timings = {}
+            for backend in backends:
+                try:
+                    timings[backend.name] = self._time(lambda: backend.decode(io.BytesIO(data.getvalue())).load())
+                except Exception:
+                    continue
+            results[('decode', extension)] = timings
+
+        self._apply_results(results)
+        if results:
+            # Só há o que gravar quando algum formato tem mais de um backend
+            self._save_results(results)
+        return results
+
+    def _apply_results(self, results):
+        """Ordena os backends de cada formato pelos tempos medidos."""
+        for (kind, key), timings in results.items():
+            backends = self.encoders.get(key, []) if kind == 'encode' else self.decoders.get(key, [])
+            backends.sort(key=lambda b: timings.get(b.name, float('inf')))
+        self.benchmark_results = results
+        self._benchmarked = True
+
+    def _signature(self):
+        # Outra versão de um backend invalida os tempos gravados
+        return [[backend.name, backend.version] for backend in self.backends]
+
+    def _load_results(self):
+        try:
+            with open(BENCHMARK_CACHE, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get('signature') != self._signature():
+            return None
+        return {(kind, key): timings for kind, key, timings in cached.get('results', [])}
+
+    def _save_results(self, results):
+        """Grava os tempos em disco; falhas apenas fazem o próximo processo medir de novo."""
+        temp_path = f"{BENCHMARK_CACHE}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(BENCHMARK_CACHE), exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'signature': self._signature(),
+                    'results': [[kind, key, timings] for (kind, key), timings in results.items()],
+                }, f)
+            os.replace(temp_path, BENCHMARK_CACHE)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def ensure_benchmarked(self):
+        """
+        Ordena os backends com os tempos gravados em disco ou, se não houver,
+        com um benchmark novo. Chamado no processo principal antes de criar
+        processos worker, que então apenas leem o resultado.
+        """
+        if not self._benchmarked:
+            with self._lock:
+                if not self._benchmarked:
+                    if os.environ.get('NEXTSMART_CODEC_BENCHMARK', '1') == '0':
+                        self._benchmarked = True
+                        return
+                    results = self._load_results()
+                    if results is None:
+                        self.benchmark()
+                    else:
+                        self._apply_results(results)
+
+    def open(self, source, metadata=False):
+        """
+        Abre a imagem com o backend mais rápido, recorrendo aos demais em caso de
+        falha. Com `metadata`, prefere os backends que preservam EXIF e ICC.
+        """
+        self.ensure_benchmarked()
+        extension = _extension(source)
+        # Extensões desconhecidas ficam com o Pillow, que detecta o formato pelo conteúdo
+        backends = self.decoders.get(extension) or [b for b in self.backends if isinstance(b, PillowBackend)]
+        if metadata:
+            backends = sorted(backends, key=lambda backend: not backend.keeps_metadata)
+        last_error = None
+        for backend in backends:
+            try:
+                if not isinstance(source, (str, os.PathLike)):
+                    source.seek(0)
+                return backend.decode(source)
+            except Exception as e:
+                last_error = e
+        if extension in self.decoders:
+            # Havia decodificador para o formato: o arquivo em si é inválido
+            raise last_error
+        hint = INSTALL_HINTS.get(extension)
+        raise UnsupportedFormatError(
+            f"Nenhum decodificador instalado para {extension or source}"
+            + (f" ({hint})" if hint else "")
+            + (f": {last_error}" if last_error else "")
+        )
+
+    def save(self, img, target, format_, **options):
+        """
+        Grava a imagem com o backend mais rápido que respeita as opções pedidas.
+        Caminhos são gravados em um arquivo temporário e renomeados no fim: um
+        processo interrompido não deixa uma saída truncada com o nome final.
+        """
+        if not isinstance(target, (str, os.PathLike)):
+            return self._save(img, target, format_, **options)
+        # Sem formato explícito, deduz pela extensão antes de trocar o nome
+        format_ = format_ or Image.registered_extensions().get(_extension(target))
+        temp_path = f"{os.fspath(target)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            backend_name = self._save(img, temp_path, format_, **options)
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return backend_name
+
+    def _save(self, img, target, format_, **options):
+        self.ensure_benchmarked()
+        if not format_:
+            # Sem formato explícito o Pillow deduz pela extensão do destino
+            img.save(target, **options)
+            return 'pillow'
+        format_ = format_.upper()
+        last_error = None
+        for backend in self.encoders.get(format_, []):
+            if not backend.can_encode(img, format_, options):
+                continue
+            try:
+                backend.encode(img, target, format_, **options)
+                return backend.name
+            except Exception as e:
+                last_error = e
+                if not isinstance(target, (str, os.PathLike)):
+                    target.seek(0)
+                    target.truncate()
+        if last_error is not None:
+            raise last_error
+        raise UnsupportedFormatError(f"Nenhum codificador instalado para {format_}")
+
+    def describe(self):
+        """Resumo dos backends instalados e da ordem escolhida por formato."""
+        self.ensure_benchmarked()
+        return {
+            'backends': [backend.name for backend in self.backends],
+            'decode': {ext: [b.name for b in backends] for ext, backends in sorted(self.decoders.items())},
+            'encode': {fmt: [b.name for b in backends] for fmt, backends in sorted(self.encoders.items())},
+        }
+
+registry = CodecRegistry()
+for _backend in (PillowBackend(), OpenCVBackend(), HeifBackend(), RawBackend()):
+    registry.register(_backend)
+
+def open_image(source, metadata=False):
+    return registry.open(source, metadata)
+
+def save_image(img, target, format_, **options):
+    return registry.save(img, target, format_, **options)
+
+def ensure_benchmarked():
+    registry.ensure_benchmarked()
+
+if __name__ == "__main__":
+    description = registry.describe()
+    print(f"Backends instalados: {', '.join(description['backends'])}")
+    for (kind, key), timings in registry.benchmark_results.items():
+        ranking = ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in
+                            sorted(timings.items(), key=lambda item: item[1]))
+        print(f"{kind} {key}: {ranking}")
+    for extension, hint in INSTALL_HINTS.items():
+        if extension not in description['decode']:
+            print(f"{extension}: sem suporte ({hint})")
@@ -1,8 +1,13 @@
 import os
-from PIL import Image, UnidentifiedImageError
-from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops, UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from collections import defaultdict
 import sys
+import argparse
+import profiling
+import byte_diet
+from encoding_profiles import DEFAULT_PROFILE, EFFORT_PROFILES, get_profile, save_options
+from codec_registry import open_image, save_image, ensure_benchmarked
 
 def print_progress_bar(progress, total, prefix='', suffix='', length=50):
     percentage = 100 * (progress / total)
@@ -13,42 +18,160 @@ def print_progress_bar(progress, total, prefix='', suffix='', length=50):
     if progress == total:
         sys.stdout.write('\n')
 
-def compress_image(file_path, output_directory):
-    try:
-        # Tenta abrir a imagem
-        img = Image.open(file_path)
+# Formatos de imagem suportados
+SUPPORTED_FORMATS = ('.jpeg', '.jpg', '.png', '.bmp', '.gif', '.webp')
+
+# Tamanhos de paleta testados pela escolha adaptativa
+PALETTE_STEPS = (2, 4, 8, 16, 32, 64, 128, 256)
+
+def choose_palette_size(img, coverage=0.995):
+    """Escolhe o menor tamanho de paleta que cobre a fração `coverage` dos pixels."""
+    colors = img.getcolors(maxcolors=65536)
+    if colors is None:
+        # Imagem fotográfica: usa a paleta completa
+        return 256
+    if len(colors) <= 256:
+        # Poucas cores, mas sem paleta exata (a mesma cor com mais de um alfa)
+        return max(2, len(colors))
+
+    total_pixels = img.width * img.height
+    accumulated = 0
+    needed = 256
+    for index, (count, _) in enumerate(sorted(colors, key=lambda c: c[0], reverse=True), 1):
+        accumulated += count
+        if accumulated >= coverage * total_pixels:
+            needed = index
+            break
+    return next((step for step in PALETTE_STEPS if step >= needed), 256)
 
-        # Cria o caminho para salvar a imagem comprimida
-        output_file_path = os.path.join(
-            output_directory, os.path.basename(file_path)
+def exact_palette(img, colors):
+    """
+    Converte para uma paleta com exatamente as cores da imagem (no máximo 256),
+    sem dithering. O alfa vai para o tRNS da paleta; devolve None quando a
+    mesma cor RGB aparece com mais de um valor de alfa.
+    """
+    alphas = {}
+    for _, color in colors:
+        alpha = color[3] if len(color) == 4 else 255
+        if alphas.setdefault(color[:3], alpha) != alpha:
+            return None
+
+    # Remapear para uma paleta pronta (quantize(palette=...)) passa pelo cache de
+    # 6 bits por canal do Pillow e troca cores vizinhas; com uma caixa para cada
+    # cor, o median cut não funde nenhuma e o remapeamento é exato
+    rgb = img.convert('RGB')
+    result = rgb.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    if ImageChops.difference(result.convert('RGB'), rgb).getbbox() is not None:
+        return None
+    if any(alpha < 255 for alpha in alphas.values()):
+        palette = result.getpalette()
+        result.info['transparency'] = bytes(
+            alphas.get(tuple(palette[i:i + 3]), 255) for i in range(0, len(palette), 3)
         )
+    return result
+
+def quantize_png(img, colors=None, dither=True):
+    """Reduz a imagem para no máximo 256 cores, preservando o canal alfa."""
+    if img.mode in ('1', 'L', 'P') and 'transparency' not in img.info:
+        # Já possui no máximo 256 níveis
+        return img
+
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+    if colors is None:
+        # Até 256 cores: paleta exata, sem perdas (o median cut fundiria cores)
+        found = img.getcolors(maxcolors=256)
+        exact = exact_palette(img, found) if found else None
+        if exact is not None:
+            return exact
+    colors = colors or choose_palette_size(img)
+
+    if has_alpha:
+        # Apenas o octree rápido suporta RGBA no Pillow (sem dithering)
+        return img.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+
+    # Gera a paleta e remapeia com o dithering escolhido
+    palette = img.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+    return img.quantize(
+        palette=palette,
+        dither=Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+    )
+
+def encode_compressed(img, target, png_quantize=False, dither=True, effort=DEFAULT_PROFILE, diet=None,
+                      report=None):
+    """
+    Comprime uma imagem já aberta e grava em `target` (caminho ou buffer).
+    Com `diet`, aplica a dieta de bytes e registra a economia em `report`.
+    """
+    # Determina o formato com base na extensão original
+    format_ = img.format if img.format in ['JPEG', 'PNG', 'WEBP'] else 'JPEG'
+    options = save_options(format_, 85, effort)
+
+    original = None
+    if diet:
+        # Orientação EXIF e conversão para sRGB antes de qualquer outra etapa
+        img, original = byte_diet.prepare(img, diet)
+
+    if format_ == 'JPEG':
+        img = img.convert('RGB')  # Garante compatibilidade para JPEG
+
+    if diet:
+        img, options = byte_diet.apply(img, format_, options, diet, original, report)
 
-        # Determina o formato com base na extensão original
-        format_ = img.format if img.format in ['JPEG', 'PNG', 'WEBP'] else 'JPEG'
+    # Comprime a imagem dependendo do formato
+    if format_ == 'JPEG':
+        save_image(img, target, format_, **options)
+    elif format_ == 'PNG':
+        if png_quantize:
+            img = quantize_png(img, dither=dither)
+        save_image(img, target, format_, **options)
+    elif format_ == 'WEBP':
+        save_image(img, target, format_, **options)
+    return format_
 
-        # Comprime a imagem dependendo do formato
-        if format_ == 'JPEG':
-            img = img.convert('RGB')  # Garante compatibilidade para JPEG
-            img.save(output_file_path, format_, quality=85, optimize=True, progressive=True)
-        elif format_ == 'PNG':
-            img.save(output_file_path, format_, optimize=True, compress_level=9)
-        elif format_ == 'WEBP':
-            img.save(output_file_path, format_, quality=85, optimize=True)
+def compress_file(file_path, output_directory, png_quantize=False, dither=True, effort=DEFAULT_PROFILE, diet=None,
+                  report=None):
+    """Comprime um arquivo e devolve o caminho gravado; erros são propagados."""
+    # Tenta abrir a imagem (a dieta de bytes precisa dos metadados originais)
+    img = open_image(file_path, metadata=bool(diet))
 
-        return os.path.basename(file_path), True
+    # Cria o caminho para salvar a imagem comprimida
+    output_file_path = os.path.join(
+        output_directory, os.path.basename(file_path)
+    )
+
+    encode_compressed(img, output_file_path, png_quantize, dither, effort, diet, report)
+    return output_file_path
+
+def compress_image(file_path, output_directory, png_quantize=False, dither=True, effort=DEFAULT_PROFILE, diet=None):
+    """Devolve o nome do arquivo, se deu certo, o relatório da dieta de bytes e a mensagem de erro."""
+    report = {}
+    try:
+        compress_file(file_path, output_directory, png_quantize, dither, effort, diet, report)
+        return os.path.basename(file_path), True, report, None
     except Exception as e:
-        return os.path.basename(file_path), False
+        # A mensagem inclui a dica de instalação de UnsupportedFormatError
+        return os.path.basename(file_path), False, report, str(e)
 
-def compress_images_in_directory(directory, output_base_directory, progress_data):
-    supported_formats = ('.jpeg', '.jpg', '.png', '.bmp', '.gif', '.webp')
+def create_executor(png_quantize=False):
+    """Executor da compressão, criado uma vez por execução e compartilhado entre as pastas."""
+    # A quantização é custosa em CPU: usa processos para paralelizar de fato
+    if png_quantize:
+        # Benchmark dos codecs no processo principal; os processos leem o resultado gravado
+        ensure_benchmarked()
+        return ProcessPoolExecutor(max_workers=os.cpu_count() or 4)
+    return ThreadPoolExecutor(max_workers=4)
 
+def compress_images_in_directory(directory, output_base_directory, progress_data, png_quantize=False, dither=True,
+                                 effort=DEFAULT_PROFILE, profiler=None, diet=None, diet_stats=None, executor=None,
+                                 log_callback=None):
     # Caminho da pasta de saída
     os.makedirs(output_base_directory, exist_ok=True)
 
     # Filtra apenas arquivos de imagem suportados
     files = [
         f for f in os.listdir(directory)
-        if os.path.isfile(os.path.join(directory, f)) and f.lower().endswith(supported_formats)
+        if os.path.isfile(os.path.join(directory, f)) and f.lower().endswith(SUPPORTED_FORMATS)
     ]
 
     if not files:
@@ -57,23 +180,41 @@ def compress_images_in_directory(directory, output_base_directory, progress_data
     total_images_compressed = 0
     image_count_by_extension = defaultdict(int)
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = []
-        for filename in files:
-            file_path = os.path.join(directory, filename)
-            futures.append(executor.submit(compress_image, file_path, output_base_directory))
+    if executor is None:
+        # Chamada avulsa: cria um executor só para esta pasta
+        with create_executor(png_quantize) as executor:
+            return compress_images_in_directory(
+                directory, output_base_directory, progress_data, png_quantize, dither, effort, profiler, diet,
+                diet_stats, executor, log_callback
+            )
 
-        for future in futures:
-            result = future.result()
-            if result[1]:
-                image_count_by_extension[os.path.splitext(result[0])[1].lower()] += 1
-                total_images_compressed += 1
-            progress_data["progress"] += 1
-            print_progress_bar(progress_data["progress"], progress_data["total"], prefix="Progresso Geral", suffix="Completado", length=50)
+    futures = []
+    for filename in files:
+        file_path = os.path.join(directory, filename)
+        futures.append(profiling.submit(
+            executor, profiler,
+            compress_image, file_path, output_base_directory, png_quantize, dither, effort, diet,
+            key=file_path
+        ))
+
+    for future in futures:
+        filename, success, report, error = future.result()
+        if success:
+            image_count_by_extension[os.path.splitext(filename)[1].lower()] += 1
+            total_images_compressed += 1
+            if diet_stats is not None:
+                diet_stats.add(report)
+        elif log_callback:
+            log_callback(f"Falha ao comprimir {filename}: {error}", "ERROR")
+        else:
+            print(f"\nFalha ao comprimir {filename}: {error}")
+        progress_data["progress"] += 1
+        print_progress_bar(progress_data["progress"], progress_data["total"], prefix="Progresso Geral", suffix="Completado", length=50)
 
     return total_images_compressed, image_count_by_extension
 
-def process_directory_recursive(base_directory, log_callback=None):
+def process_directory_recursive(base_directory, log_callback=None, png_quantize=False, dither=True,
+                                effort=DEFAULT_PROFILE, dry_run=False, profile=None, diet=None):
     base_directory = base_directory.strip('"')
 
     if not os.path.exists(base_directory):
@@ -81,46 +222,113 @@ def process_directory_recursive(base_directory, log_callback=None):
             log_callback(f"O diretório '{base_directory}' não existe.", "ERROR")
         return
 
+    try:
+        # Valida o perfil antes de enviar qualquer trabalho, e não uma falha por imagem
+        get_profile(effort)
+    except ValueError as e:
+        if log_callback:
+            log_callback(str(e), "ERROR")
+        else:
+            print(e)
+        return
+
+    if dry_run:
+        # Apenas estima o custo da execução, sem gravar nenhuma saída
+        from estimator import estimate_run, format_estimate
+        estimate = estimate_run(base_directory, 'compress', png_quantize=png_quantize, dither=dither, effort=effort,
+                                diet=diet)
+        for line in format_estimate(estimate):
+            if log_callback:
+                log_callback(line, "INFO")
+            else:
+                print(line)
+        return estimate
+
     total_compressed = 0
     overall_image_count_by_extension = defaultdict(int)
 
     # Calcula o número total de arquivos para a barra de progresso geral
     total_files = sum(
-        len([f for f in files if f.lower().endswith(('.jpeg', '.jpg', '.png', '.bmp', '.gif', '.webp'))])
+        len([f for f in files if f.lower().endswith(SUPPORTED_FORMATS)])
         for _, _, files in os.walk(base_directory)
     )
 
     progress_data = {"progress": 0, "total": total_files}
+    diet_stats = byte_diet.DietStats() if diet else None
 
-    # Caminha pela estrutura de diretórios
-    for root, dirs, files in os.walk(base_directory):
-        relative_path = os.path.relpath(root, base_directory)
-        output_base_directory = os.path.join(base_directory + "-optimized", relative_path)
+    # Perfilamento opcional (cProfile + tracemalloc); desligado não tem custo
+    profiler = profiling.RunProfiler(profile).start() if profile else None
 
-        os.makedirs (output_base_directory, exist_ok=True)
+    try:
+        # Um único executor para toda a árvore: evita recriar processos a cada pasta
+        with create_executor(png_quantize) as executor:
+            # Caminha pela estrutura de diretórios
+            for root, dirs, files in os.walk(base_directory):
+                relative_path = os.path.relpath(root, base_directory)
+                output_base_directory = os.path.join(base_directory + "-optimized", relative_path)
 
-        # Comprime as imagens no diretório atual
-        compressed, image_count_by_extension = compress_images_in_directory(root, output_base_directory, progress_data)
+                os.makedirs (output_base_directory, exist_ok=True)
 
-        total_compressed += compressed
-        for ext, count in image_count_by_extension.items():
-            overall_image_count_by_extension[ext] += count
+                # Comprime as imagens no diretório atual
+                compressed, image_count_by_extension = compress_images_in_directory(
+                    root, output_base_directory, progress_data, png_quantize, dither, effort, profiler, diet, diet_stats,
+                    executor, log_callback
+                )
 
-        # Atualizar log após cada diretório processado
+                total_compressed += compressed
+                for ext, count in image_count_by_extension.items():
+                    overall_image_count_by_extension[ext] += count
+
+                # Atualizar log após cada diretório processado
+                if log_callback:
+                    log_callback(f"Diretório processado: {relative_path}, Total comprimido: {compressed}", "INFO")
+
+        # Exibe o relatório final
         if log_callback:
-            log_callback(f"Diretório processado: {relative_path}, Total comprimido: {compressed}", "INFO")
+            log_callback("\n--- Compressão Concluída ---", "INFO")
+            log_callback(f"Total de imagens comprimidas: {total_compressed}", "SUCCESS")
+            log_callback("Quantidade por tipo de imagem:", "INFO")
+            for ext, count in overall_image_count_by_extension.items():
+                log_callback(f"{ext}: {count}", "INFO")
 
-    # Exibe o relatório final
-    if log_callback:
-        log_callback("\n--- Compressão Concluída ---", "INFO")
-        log_callback(f"Total de imagens comprimidas: {total_compressed}", "SUCCESS")
-        log_callback("Quantidade por tipo de imagem:", "INFO")
-        for ext, count in overall_image_count_by_extension.items():
-            log_callback(f"{ext}: {count}", "INFO")
+        if diet_stats:
+            for line in diet_stats.summary_lines():
+                if log_callback:
+                    log_callback(line, "INFO")
+                else:
+                    print(line)
+    finally:
+        # Mesmo com erro no meio da execução, desliga o cProfile e o tracemalloc
+        if profiler:
+            summary = profiler.stop()
+            message = f"Perfil salvo em: {summary['prof_path']} e {summary['json_path']}"
+            if log_callback:
+                log_callback(message, "INFO")
+            else:
+                print(message)
 
 def main():
-    base_directory = input("Insira o diretório base das imagens: ")
-    process_directory_recursive(base_directory)
+    parser = argparse.ArgumentParser(description="Compressor de Imagens")
+    parser.add_argument("base_directory", nargs='?', help="Diretório base das imagens")
+    parser.add_argument("--profile", nargs='?', const='nextsmart-profile', default=None,
+                        help="Gera <prefixo>.prof e <prefixo>.json com cProfile e tracemalloc")
+    parser.add_argument("--diet", choices=byte_diet.DIET_POLICIES, default=None,
+                        help="Dieta de bytes: orientação EXIF, política de metadados e croma por conteúdo")
+    args = parser.parse_args()
+
+    base_directory = args.base_directory or input("Insira o diretório base das imagens: ")
+    png_quantize = input("Usar paleta quantizada para PNG? (s/n): ").strip().lower() == 's'
+    dither = True
+    if png_quantize:
+        dither = input("Aplicar dithering? (s/n): ").strip().lower() != 'n'
+    while True:
+        effort = input(f"Perfil de esforço ({'/'.join(EFFORT_PROFILES)}) [{DEFAULT_PROFILE}]: ").strip().lower() \
+            or DEFAULT_PROFILE
+        if effort in EFFORT_PROFILES:
+            break
+        print(f"Perfil inválido: {effort}")
+    process_directory_recursive(base_directory, png_quantize=png_quantize, dither=dither, effort=effort,
+                                profile=args.profile, diet=args.diet)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
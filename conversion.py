@@ -3,55 +3,90 @@ import io
 from PIL import Image, UnidentifiedImageError
 from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
-
-def convert_image(file_path, output_directory, output_format='jpeg'):
+import argparse
+import profiling
+import byte_diet
+from encoding_profiles import CONVERT_DEFAULT_PROFILE, EFFORT_PROFILES, get_profile, save_options as profile_save_options
+from codec_registry import open_image, save_image
+
+# Formatos de imagem suportados
+SUPPORTED_FORMATS = (
+    '.jpeg', '.jpg', '.png', '.bmp', '.gif', 
+    '.webp', '.tiff', '.tif', '.raw', '.heic'
+)
+
+def encode_converted(original_img, target, output_format='jpeg', effort=CONVERT_DEFAULT_PROFILE, diet=None, report=None):
+    """
+    Converte uma imagem já aberta e grava em `target` (caminho ou buffer).
+    Com `diet`, aplica a dieta de bytes e registra a economia em `report`.
+    """
+    original = None
+    if diet:
+        # Orientação EXIF e conversão para sRGB antes de qualquer outra etapa
+        original_img, original = byte_diet.prepare(original_img, diet)
+
+    # Converte para RGB, preservando o modo de cor original
+    img = original_img.convert('RGB')
+
+    # Configurações de salvamento flexíveis
+    save_options = {
+        'optimize': True,
+        'quality': 95  # Alta qualidade
+    }
+
+    # Tratamento específico para diferentes formatos, conforme o perfil de esforço
+    if output_format.lower() in ['jpeg', 'jpg']:
+        # Suporte para imagens extremamente grandes
+        format_, options = 'JPEG', profile_save_options('JPEG', 95, effort)
+    elif output_format.lower() == 'webp':
+        # Configuração específica para WebP
+        format_, options = 'WEBP', dict(lossless=False, **profile_save_options('WEBP', 95, effort))
+    elif output_format.lower() == 'png':
+        # Otimização para PNG
+        format_, options = 'PNG', profile_save_options('PNG', 95, effort)
+    else:
+        format_, options = output_format.upper(), save_options
+
+    if diet:
+        img, options = byte_diet.apply(img, format_, options, diet, original, report)
+    save_image(img, target, format_, **options)
+
+def convert_file(file_path, output_directory, output_format='jpeg', effort=CONVERT_DEFAULT_PROFILE, diet=None,
+                 report=None):
+    """Converte um arquivo e devolve o caminho gravado; erros são propagados."""
+    # Abre a imagem com máxima resolução e sem limite de memória
+    with open_image(file_path, metadata=bool(diet)) as original_img:
+        # Cria o caminho para salvar a imagem convertida, mantendo a estrutura de diretórios
+        relative_path = os.path.relpath(file_path, os.path.dirname(output_directory))
+        output_file_path = os.path.join(
+            output_directory, 
+            os.path.splitext(relative_path)[0] + f'.{output_format}'
+        )
+
+        # Cria o diretório de saída se não existir
+        os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+
+        encode_converted(original_img, output_file_path, output_format, effort, diet, report)
+    return output_file_path
+
+def convert_image(file_path, output_directory, output_format='jpeg', effort=CONVERT_DEFAULT_PROFILE, diet=None):
+    """Devolve o nome do arquivo, se deu certo, o relatório da dieta de bytes e a mensagem de erro."""
+    report = {}
     try:
-        # Abre a imagem com máxima resolução e sem limite de memória
-        with Image.open(file_path) as original_img:
-            # Converte para RGB, preservando o modo de cor original
-            img = original_img.convert('RGB')
-
-            # Cria o caminho para salvar a imagem convertida, mantendo a estrutura de diretórios
-            relative_path = os.path.relpath(file_path, os.path.dirname(output_directory))
-            output_file_path = os.path.join(
-                output_directory, 
-                os.path.splitext(relative_path)[0] + f'.{output_format}'
-            )
-
-            # Cria o diretório de saída se não existir
-            os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-
-            # Configurações de salvamento flexíveis
-            save_options = {
-                'optimize': True,
-                'quality': 95  # Alta qualidade
-            }
-
-            # Tratamento específico para diferentes formatos
-            if output_format.lower() in ['jpeg', 'jpg']:
-                # Suporte para imagens extremamente grandes
-                img.save(output_file_path, 'JPEG', **save_options, progressive=True)
-            elif output_format.lower() == 'webp':
-                # Configuração específica para WebP
-                save_options['method'] = 6  # Melhor compressão
-                save_options['lossless'] = False
-                img.save(output_file_path, 'WEBP', **save_options)
-            elif output_format.lower() == 'png':
-                # Otimização para PNG
-                save_options['compress_level'] = 9
-                img.save(output_file_path, 'PNG', **save_options)
-            else:
-                img.save(output_file_path, output_format.upper(), **save_options)
-        
-        return os.path.basename(file_path), True
+        convert_file(file_path, output_directory, output_format, effort, diet, report)
+        return os.path.basename(file_path), True, report, None
     except Exception as e:
-        print(f"Erro ao converter {file_path}: {e}")
-        return os.path.basename(file_path), False
+        # A mensagem inclui a dica de instalação de UnsupportedFormatError
+        return os.path.basename(file_path), False, report, str(e)
 
 def convert_images(
     directory, 
     output_format='jpeg', 
-    log_callback=None
+    log_callback=None,
+    effort=CONVERT_DEFAULT_PROFILE,
+    dry_run=False,
+    profile=None,
+    diet=None
 ):
     # Configurações para lidar com imagens muito grandes
     Image.MAX_IMAGE_PIXELS = None  # Remove o limite de pixels
@@ -63,76 +98,121 @@ def convert_images(
             log_callback(f"O diretório '{directory}' não existe.", "ERROR")
         return
 
+    try:
+        # Valida o perfil antes de enviar qualquer trabalho, e não uma falha por imagem
+        get_profile(effort)
+    except ValueError as e:
+        if log_callback:
+            log_callback(str(e), "ERROR")
+        else:
+            print(e)
+        return
+
+    if dry_run:
+        # Apenas estima o custo da execução, sem gravar nenhuma saída
+        from estimator import estimate_run, format_estimate
+        estimate = estimate_run(directory, 'convert', output_format=output_format, effort=effort, diet=diet)
+        for line in format_estimate(estimate):
+            if log_callback:
+                log_callback(line, "INFO")
+            else:
+                print(line)
+        return estimate
+
     # Diretório de saída base
     output_base_directory = directory + "-converted"
     os.makedirs(output_base_directory, exist_ok=True)
 
-    # Formatos de imagem suportados
-    supported_formats = (
-        '.jpeg', '.jpg', '.png', '.bmp', '.gif', 
-        '.webp', '.tiff', '.tif', '.raw', '.heic'
-    )
-
     image_count_by_extension = defaultdict(int)
     total_images_converted = 0
     total_files = 0
     failed_files = []
+    diet_stats = byte_diet.DietStats() if diet else None
 
     # Contar total de arquivos suportados
     for root, _, files in os.walk(directory):
-        total_files += len([f for f in files if f.lower().endswith(supported_formats)])
+        total_files += len([f for f in files if f.lower().endswith(SUPPORTED_FORMATS)])
 
     if total_files == 0:
         if log_callback:
             log_callback("Nenhuma imagem foi encontrada no diretório.", "WARNING")
         return
 
-    # Usar ThreadPoolExecutor com número de workers baseado no número de CPUs
-    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
-        futures = []
-        processed_files = 0
-
-        # Percorrer todas as pastas e subpastas
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                if filename.lower().endswith(supported_formats):
-                    file_path = os.path.join(root, filename)
-                    futures.append(
-                        executor.submit(
-                            convert_image, 
-                            file_path, 
-                            output_base_directory, 
-                            output_format
+    # Perfilamento opcional (cProfile + tracemalloc); desligado não tem custo
+    profiler = profiling.RunProfiler(profile).start() if profile else None
+
+    try:
+        # Usar ThreadPoolExecutor com número de workers baseado no número de CPUs
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+            futures = []
+            processed_files = 0
+
+            # Percorrer todas as pastas e subpastas
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if filename.lower().endswith(SUPPORTED_FORMATS):
+                        file_path = os.path.join(root, filename)
+                        futures.append(
+                            profiling.submit(
+                                executor,
+                                profiler,
+                                convert_image, 
+                                file_path, 
+                                output_base_directory, 
+                                output_format,
+                                effort,
+                                diet,
+                                key=file_path
+                            )
                         )
-                    )
 
-        # Processar resultados
-        for future in futures:
-            filename, success = future.result()
-            processed_files += 1
-            
-            if success:
-                image_count_by_extension[os.path.splitext(filename)[1].lower()] += 1
-                total_images_converted += 1
-            else:
-                failed_files.append(filename)
+            # Processar resultados
+            for future in futures:
+                filename, success, report, error = future.result()
+                processed_files += 1
+                
+                if success:
+                    image_count_by_extension[os.path.splitext(filename)[1].lower()] += 1
+                    total_images_converted += 1
+                    if diet_stats is not None:
+                        diet_stats.add(report)
+                else:
+                    failed_files.append((filename, error))
+                    if not log_callback:
+                        print(f"Erro ao converter {filename}: {error}")
+                
+                # Atualizar log de progresso
+                if log_callback:
+                    log_callback(f"Progresso: {processed_files}/{total_files} imagens", "INFO")
+
+        # Exibe o relatório final
+        if log_callback:
+            log_callback(f"Total de imagens convertidas: {total_images_converted}", "SUCCESS")
+            log_callback("Quantidade por tipo de imagem:", "INFO")
+            for ext, count in image_count_by_extension.items():
+                log_callback(f"{ext}: {count}", "INFO")
             
-            # Atualizar log de progresso
+            # Log de arquivos que falharam
+            if failed_files:
+                log_callback("Arquivos que falharam na conversão:", "WARNING")
+                for file, error in failed_files:
+                    log_callback(f"{file}: {error}", "ERROR")
+
+        if diet_stats:
+            for line in diet_stats.summary_lines():
+                if log_callback:
+                    log_callback(line, "INFO")
+                else:
+                    print(line)
+    finally:
+        # Mesmo com erro no meio da execução, desliga o cProfile e o tracemalloc
+        if profiler:
+            summary = profiler.stop()
+            message = f"Perfil salvo em: {summary['prof_path']} e {summary['json_path']}"
             if log_callback:
-                log_callback(f"Progresso: {processed_files}/{total_files} imagens", "INFO")
-
-    # Exibe o relatório final
-    if log_callback:
-        log_callback(f"Total de imagens convertidas: {total_images_converted}", "SUCCESS")
-        log_callback("Quantidade por tipo de imagem:", "INFO")
-        for ext, count in image_count_by_extension.items():
-            log_callback(f"{ext}: {count}", "INFO")
-        
-        # Log de arquivos que falharam
-        if failed_files:
-            log_callback("Arquivos que falharam na conversão:", "WARNING")
-            for file in failed_files:
-                log_callback(file, "ERROR")
+                log_callback(message, "INFO")
+            else:
+                print(message)
 
 def display_supported_formats():
     # Formatos que podem ser escolhidos
@@ -153,7 +233,22 @@ def display_supported_formats():
         return None
 
 if __name__ == "__main__":
-    directory = input("Insira o diretório das imagens: ")
+    parser = argparse.ArgumentParser(description="Conversor de Imagens")
+    parser.add_argument("directory", nargs='?', help="Diretório das imagens")
+    parser.add_argument("--profile", nargs='?', const='nextsmart-profile', default=None,
+                        help="Gera <prefixo>.prof e <prefixo>.json com cProfile e tracemalloc")
+    parser.add_argument("--diet", choices=byte_diet.DIET_POLICIES, default=None,
+                        help="Dieta de bytes: orientação EXIF, política de metadados e croma por conteúdo")
+    args = parser.parse_args()
+
+    directory = args.directory or input("Insira o diretório das imagens: ")
     output_format = display_supported_formats()
     if output_format:
-        convert_images(directory, output_format)
\ No newline at end of file
+        while True:
+            effort = input(f"Perfil de esforço ({'/'.join(EFFORT_PROFILES)}) [{CONVERT_DEFAULT_PROFILE}]: ") \
+                .strip().lower() or CONVERT_DEFAULT_PROFILE
+            if effort in EFFORT_PROFILES:
+                break
+            print(f"Perfil inválido: {effort}")
+        convert_images(directory, output_format, effort=effort, profile=args.profile,
+                       diet=args.diet)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+import io
+import time
+import random
+import argparse
+from codec_registry import open_image, save_image
+
+# Perfis de esforço do codificador: trocam velocidade por tamanho de arquivo.
+# Observação: no PNG o Pillow ignora `compress_level` quando `optimize=True`.
+# O perfil 'max' reproduz as configurações anteriores à criação dos perfis na
+# compressão e no fatiamento (method 4 padrão do WebP); 'slowest' é o da
+# conversão, que sempre gravou WebP com o method 6.
+# A subamostragem fica em 4:2:0 em todos: os perfis trocam velocidade por
+# tamanho, não a qualidade do croma (ajustada por conteúdo na dieta de bytes).
+EFFORT_PROFILES = {
+    'fast': {
+        'webp_method': 0,
+        'png_compress_level': 1,
+        'optimize': False,
+        'progressive': False,
+        'subsampling': '4:2:0',
+    },
+    'balanced': {
+        'webp_method': 4,
+        'png_compress_level': 6,
+        'optimize': False,
+        'progressive': False,
+        'subsampling': '4:2:0',
+    },
+    'max': {
+        'webp_method': 4,
+        'png_compress_level': 9,
+        'optimize': True,
+        'progressive': True,
+        'subsampling': '4:2:0',
+    },
+    'slowest': {
+        'webp_method': 6,
+        'png_compress_level': 9,
+        'optimize': True,
+        'progressive': True,
+        'subsampling': '4:2:0',
+    },
+}
+
+DEFAULT_PROFILE = 'max'
+CONVERT_DEFAULT_PROFILE = 'slowest'
+
+def get_profile(effort=DEFAULT_PROFILE):
+    """Retorna as configurações do perfil de esforço informado."""
+    try:
+        return EFFORT_PROFILES[effort]
+    except KeyError:
+        raise ValueError(
+            f"Perfil de esforço desconhecido: {effort}. "
+            f"Use um de: {', '.join(EFFORT_PROFILES)}"
+        )
+
+def save_options(format_, quality, effort=DEFAULT_PROFILE):
+    """Monta os argumentos de `Image.save` para o formato e o perfil de esforço."""
+    profile = get_profile(effort)
+    format_ = format_.upper()
+
+    if format_ in ('JPEG', 'JPG'):
+        return {
+            'quality': quality,
+            'optimize': profile['optimize'],
+            'progressive': profile['progressive'],
+            'subsampling': profile['subsampling'],
+        }
+    elif format_ == 'PNG':
+        return {
+            'optimize': profile['optimize'],
+            'compress_level': profile['png_compress_level'],
+        }
+    elif format_ == 'WEBP':
+        return {
+            'quality': quality,
+            'method': profile['webp_method'],
+        }
+    return {}
+
+def _sample_images(directory, sample_size, supported_formats):
+    files = [
+        os.path.join(root, f)
+        for root, _, names in os.walk(directory)
+        for f in names
+        if f.lower().endswith(supported_formats)
+    ]
+    return random.sample(files, min(sample_size, len(files)))
+
+def calibrate_profiles(directory, sample_size=20, formats=('JPEG', 'PNG', 'WEBP'), quality=85):
+    """
+    Mede o tempo de codificação e o tamanho gerado por cada perfil em uma
+    amostra das imagens do usuário. Nada é gravado em disco.
+    """
+    supported_formats = ('.jpeg', '.jpg', '.png', '.bmp', '.gif', '.webp', '.tiff', '.tif')
+    sample = _sample_images(directory, sample_size, supported_formats)
+
+    # Decodifica a amostra uma única vez para medir apenas a codificação
+    images = []
+    for file_path in sample:
+        try:
+            with open_image(file_path) as img:
+                img.load()
+                images.append(img.convert('RGBA' if 'A' in img.getbands() else 'RGB'))
+        except Exception as e:
+            print(f"Erro ao abrir {file_path}: {e}")
+
+    results = {}
+    if not images:
+        return results
+
+    for format_ in formats:
+        format_ = format_.upper()
+        for effort in EFFORT_PROFILES:
+            options = save_options(format_, quality, effort)
+            total_time = 0.0
+            total_bytes = 0
+            for img in images:
+                if format_ == 'JPEG' and img.mode != 'RGB':
+                    img = img.convert('RGB')
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                # Mesmo caminho de gravação das operações: o backend escolhido pelo registro
+                save_image(img, buffer, format_, **options)
+                total_time += time.perf_counter() - start
+                total_bytes += buffer.tell()
+            results[(format_, effort)] = {
+                'ms_per_image': 1000 * total_time / len(images),
+                'bytes_per_image': total_bytes / len(images),
+            }
+    return results
+
+def print_calibration(results):
+    print(f"{'Formato':<8} {'Perfil':<10} {'ms/imagem':>10} {'bytes/imagem':>14}")
+    for (format_, effort), data in results.items():
+        print(f"{format_:<8} {effort:<10} {data['ms_per_image']:>10.1f} {data['bytes_per_image']:>14.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibração dos perfis de esforço")
+    parser.add_argument("input_dir", type=str, help="Diretório com imagens de amostra")
+    parser.add_argument("--sample", type=int, default=20, help="Quantidade de imagens na amostra")
+    parser.add_argument("--formats", nargs='+', default=['jpeg', 'png', 'webp'],
+                        choices=['jpeg', 'png', 'webp'], help="Formatos a medir")
+    parser.add_argument("--quality", type=int, default=85, help="Qualidade usada em JPEG/WebP (1-100)")
+
+    args = parser.parse_args()
+
+    results = calibrate_profiles(args.input_dir, args.sample, args.formats, args.quality)
+    if results:
+        print_calibration(results)
+    else:
+        print("Nenhuma imagem foi encontrada no diretório.")
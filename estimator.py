@@ -0,0 +1,275 @@
+import os
+import io
+import time
+import random
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+import compress
+import conversion
+from image_processor import ImageProcessor
+from encoding_profiles import DEFAULT_PROFILE, CONVERT_DEFAULT_PROFILE, EFFORT_PROFILES
+import byte_diet
+from codec_registry import open_image
+
+# Quantidade de erros da amostra listados no relatório
+MAX_REPORTED_ERRORS = 3
+
+# Faixas de tamanho (em megapixels) usadas na estratificação da amostra
+SIZE_BUCKETS = (0.25, 1, 4, 16, 64)
+
+# Bytes por pixel de cada modo decodificado pelo Pillow
+BYTES_PER_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'LA': 4, 'PA': 4, 'RGB': 4, 'RGBA': 4, 'CMYK': 4, 'YCbCr': 4,
+                   'I': 4, 'F': 4, 'I;16': 2}
+
+def _read_header(file_path):
+    """Lê apenas o cabeçalho da imagem, sem decodificar os pixels."""
+    try:
+        with Image.open(file_path) as img:
+            return {
+                'path': file_path,
+                'format': img.format or 'UNKNOWN',
+                'mode': img.mode,
+                'width': img.width,
+                'height': img.height,
+                'bytes': os.path.getsize(file_path),
+            }
+    except Exception:
+        return None
+
+def scan_headers(directory, supported_formats, max_workers=16):
+    """Percorre a árvore lendo os cabeçalhos das imagens suportadas."""
+    files = [
+        os.path.join(root, f)
+        for root, _, names in os.walk(directory)
+        for f in names
+        if f.lower().endswith(supported_formats)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        headers = list(executor.map(_read_header, files))
+    return [header for header in headers if header]
+
+def size_bucket(width, height):
+    megapixels = width * height / 1_000_000
+    for index, limit in enumerate(SIZE_BUCKETS):
+        if megapixels <= limit:
+            return index
+    return len(SIZE_BUCKETS)
+
+def stratified_sample(entries, sample_size, seed=None):
+    """Sorteia uma amostra proporcional por formato e faixa de tamanho (ao menos 1 por estrato)."""
+    strata = defaultdict(list)
+    for entry in entries:
+        strata[(entry['format'], size_bucket(entry['width'], entry['height']))].append(entry)
+
+    rng = random.Random(seed)
+    total = len(entries)
+    sample = {}
+    for key, members in strata.items():
+        count = max(1, round(sample_size * len(members) / total))
+        sample[key] = rng.sample(members, min(count, len(members)))
+    return strata, sample
+
+def _output_pixels(entry, operation, width):
+    if operation == 'slice' and width > 0:
+        return width * int((width / entry['width']) * entry['height'])
+    return entry['width'] * entry['height']
+
+def _decoded_bytes(entry):
+    pixels = entry['width'] * entry['height']
+    return pixels * BYTES_PER_PIXEL.get(entry['mode'], 4)
+
+def _process_sample(entry, operation, options, processor):
+    """Processa integralmente uma imagem da amostra em memória, devolvendo (segundos, bytes)."""
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    diet = options.get('diet')
+    with open_image(entry['path'], metadata=bool(diet)) as img:
+        if operation == 'compress':
+            compress.encode_compressed(
+                img, buffer, options.get('png_quantize', False), options.get('dither', True),
+                options.get('effort', DEFAULT_PROFILE), diet
+            )
+        elif operation == 'convert':
+            conversion.encode_converted(
+                img, buffer, options.get('output_format', 'jpeg'), options.get('effort', CONVERT_DEFAULT_PROFILE), diet
+            )
+        else:
+            output_format = options.get('output_format')
+            # Lido antes da dieta: o exif_transpose devolve uma imagem sem formato
+            format_to_save = output_format.upper() if output_format else (
+                img.format or Image.registered_extensions().get(os.path.splitext(entry['path'])[1].lower())
+            )
+            if diet:
+                img, _ = byte_diet.prepare(img, diet)
+            width = options.get('width', 0)
+            resized = processor.resize_image(img, width) if width > 0 else img
+            processor.encode_image(resized, buffer, format_to_save)
+    return time.perf_counter() - start, buffer.tell()
+
+def _default_workers(operation, options):
+    if operation == 'compress':
+        return (os.cpu_count() or 4) if options.get('png_quantize') else 4
+    if operation == 'convert':
+        return os.cpu_count() or 4
+    # O fatiamento decodifica as imagens de cada pasta em sequência
+    return 1
+
+def _peak_memory(entries, operation, options, workers):
+    """Estima o pico de memória a partir dos cabeçalhos."""
+    if not entries:
+        return 0
+    if operation == 'slice':
+        # Cada pasta mantém as imagens redimensionadas e a tira completa em memória
+        width = options.get('width', 0)
+        by_folder = defaultdict(int)
+        for entry in entries:
+            by_folder[os.path.dirname(entry['path'])] += _output_pixels(entry, operation, width) * 4
+        largest_source = max(_decoded_bytes(entry) for entry in entries)
+        return 2 * max(by_folder.values()) + largest_source
+
+    # Até `workers` imagens decodificadas ao mesmo tempo, mais a cópia convertida de cada uma
+    largest = sorted((_decoded_bytes(entry) for entry in entries), reverse=True)[:workers]
+    return 2 * sum(largest)
+
+def estimate_run(directory, operation, workers=None, sample_size=30, seed=None, **options):
+    """
+    Estima tempo total, bytes de saída e pico de memória de uma execução sem gravar nada.
+
+    `operation` é 'compress', 'convert' ou 'slice'; `options` recebe os mesmos
+    parâmetros da execução real (effort, png_quantize, output_format, width...).
+    """
+    if operation == 'compress':
+        supported_formats = compress.SUPPORTED_FORMATS
+    elif operation == 'convert':
+        supported_formats = conversion.SUPPORTED_FORMATS
+    elif operation == 'slice':
+        supported_formats = tuple(ImageProcessor().supported_formats)
+    else:
+        raise ValueError(f"Operação desconhecida: {operation}")
+
+    workers = workers or _default_workers(operation, options)
+    entries = scan_headers(directory, supported_formats)
+    estimate = {
+        'operation': operation,
+        'files': len(entries),
+        'input_bytes': sum(entry['bytes'] for entry in entries),
+        'sampled': 0,
+        'failed_samples': 0,
+        'sample_errors': [],
+        'unsampled_files': 0,
+        'workers': workers,
+        'estimated_seconds': 0.0,
+        'estimated_output_bytes': 0,
+        'estimated_peak_memory_bytes': _peak_memory(entries, operation, options, workers),
+    }
+    if not entries:
+        return estimate
+
+    processor = ImageProcessor(logging.getLogger(__name__))
+    processor.quality = options.get('quality', 85)
+    processor.effort = options.get('effort', DEFAULT_PROFILE)
+    processor.diet = options.get('diet')
+    width = options.get('width', 0)
+
+    strata, sample = stratified_sample(entries, sample_size, seed)
+    total_seconds = 0.0
+    total_output_bytes = 0.0
+    # Totais das amostras bem-sucedidas, usados nos estratos sem nenhuma
+    sampled_seconds = 0.0
+    sampled_bytes = 0
+    sampled_pixels = 0
+    unsampled_pixels = 0
+    for key, members in strata.items():
+        sample_seconds = 0.0
+        sample_bytes = 0
+        sample_pixels = 0
+        for entry in sample[key]:
+            try:
+                seconds, output_bytes = _process_sample(entry, operation, options, processor)
+            except Exception as e:
+                estimate['failed_samples'] += 1
+                if len(estimate['sample_errors']) < MAX_REPORTED_ERRORS:
+                    estimate['sample_errors'].append(f"{entry['path']}: {e}")
+                continue
+            sample_seconds += seconds
+            sample_bytes += output_bytes
+            sample_pixels += _output_pixels(entry, operation, width)
+            estimate['sampled'] += 1
+
+        # Extrapola pelo total de pixels do estrato (tempo e bytes crescem com a área)
+        stratum_pixels = sum(_output_pixels(entry, operation, width) for entry in members)
+        if not sample_pixels:
+            estimate['unsampled_files'] += len(members)
+            unsampled_pixels += stratum_pixels
+            continue
+        total_seconds += sample_seconds / sample_pixels * stratum_pixels
+        total_output_bytes += sample_bytes / sample_pixels * stratum_pixels
+        sampled_seconds += sample_seconds
+        sampled_bytes += sample_bytes
+        sampled_pixels += sample_pixels
+
+    if unsampled_pixels and sampled_pixels:
+        # Estratos cujas amostras falharam todas: usa a taxa média dos demais, em vez de zero
+        total_seconds += sampled_seconds / sampled_pixels * unsampled_pixels
+        total_output_bytes += sampled_bytes / sampled_pixels * unsampled_pixels
+
+    effective_workers = max(1, min(workers, os.cpu_count() or 1))
+    estimate['estimated_seconds'] = total_seconds / effective_workers
+    estimate['estimated_output_bytes'] = int(total_output_bytes)
+    return estimate
+
+def format_estimate(estimate):
+    """Gera as linhas do relatório de estimativa."""
+    saved = estimate['input_bytes'] - estimate['estimated_output_bytes']
+    lines = [
+        f"--- Estimativa ({estimate['operation']}, simulação sem gravação) ---",
+        f"Imagens encontradas: {estimate['files']} (amostra processada: {estimate['sampled']})",
+        f"Workers: {estimate['workers']}",
+        f"Tempo estimado: {estimate['estimated_seconds']:.1f}s",
+        f"Tamanho de entrada: {estimate['input_bytes'] / 1024 ** 2:.1f} MB",
+        f"Tamanho de saída estimado: {estimate['estimated_output_bytes'] / 1024 ** 2:.1f} MB",
+        f"Economia estimada: {saved / 1024 ** 2:.1f} MB",
+        f"Pico de memória estimado: {estimate['estimated_peak_memory_bytes'] / 1024 ** 2:.1f} MB",
+    ]
+    if estimate['failed_samples']:
+        lines.append(f"Atenção: {estimate['failed_samples']} imagem(ns) da amostra falharam ao processar")
+        lines.extend(f"  {error}" for error in estimate['sample_errors'])
+    if estimate['unsampled_files']:
+        if estimate['sampled']:
+            lines.append(f"Atenção: {estimate['unsampled_files']} imagem(ns) em grupos sem amostra válida, "
+                         "estimadas pela média dos demais grupos")
+        else:
+            lines.append("Atenção: nenhuma amostra foi processada; tempo e tamanho de saída não puderam ser estimados")
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimativa de custo (simulação sem gravação)")
+    parser.add_argument("operation", choices=['compress', 'convert', 'slice'], help="Operação a estimar")
+    parser.add_argument("input_dir", type=str, help="Diretório de entrada com imagens")
+    parser.add_argument("--workers", type=int, default=None, help="Quantidade de workers da execução real")
+    parser.add_argument("--sample", type=int, default=30, help="Tamanho da amostra processada")
+    parser.add_argument("--seed", type=int, default=None, help="Semente do sorteio da amostra")
+    parser.add_argument("--effort", type=str, choices=list(EFFORT_PROFILES), default=None,
+                        help=f"Perfil de esforço do codificador (padrão: {CONVERT_DEFAULT_PROFILE} na "
+                             f"conversão, {DEFAULT_PROFILE} nas demais)")
+    parser.add_argument("--output_format", type=str, choices=['jpeg', 'jpg', 'png', 'webp'],
+                        help="Formato de saída (convert/slice)")
+    parser.add_argument("--png_quantize", action='store_true', help="Paleta quantizada para PNG (compress)")
+    parser.add_argument("--width", type=int, default=800, help="Largura-alvo (slice)")
+    parser.add_argument("--quality", type=int, default=85, help="Qualidade da imagem (slice)")
+
+    args = parser.parse_args()
+
+    options = {'png_quantize': args.png_quantize, 'width': args.width, 'quality': args.quality}
+    if args.effort:
+        options['effort'] = args.effort
+    if args.output_format:
+        options['output_format'] = args.output_format
+    estimate = estimate_run(args.input_dir.strip('"'), args.operation, args.workers, args.sample, args.seed,
+                            **options)
+    for line in format_estimate(estimate):
+        print(line)
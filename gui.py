@@ -5,11 +5,14 @@ import threading
 import os
 import logging
 import time
-from image_processor import ImageProcessor, GuiLoggingHandler
+from image_processor import ImageProcessor, GuiLoggingHandler, OUTPUT_MODES
+from pixel_cache import DEFAULT_CACHE_DIR
 import ctypes
 import sys
 import conversion
 import compress as compress_module  
+from encoding_profiles import DEFAULT_PROFILE, CONVERT_DEFAULT_PROFILE, EFFORT_PROFILES
+from byte_diet import DIET_POLICIES
 from tkinter import messagebox  
 
 class CustomLogFrame(ttk.Frame):
@@ -160,6 +163,30 @@ class ImageProcessorGUI:
         self.height_var = tk.StringVar(value="")
         ttk.Entry(height_frame, textvariable=self.height_var).pack(fill='x')
 
+        mode_frame = ttk.Frame(settings_frame_size)
+        mode_frame.pack(side='right', fill='x', expand=True, padx=5)
+        ttk.Label(mode_frame, text="Saída das Fatias:").pack()
+        self.output_mode_var = tk.StringVar(value='files')
+        ttk.Combobox(
+            mode_frame,
+            textvariable=self.output_mode_var,
+            values=list(OUTPUT_MODES),
+            state='readonly',
+            width=10
+        ).pack(fill='x')
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            mode_frame,
+            text="Só o que mudou",
+            variable=self.incremental_var
+        ).pack(fill='x')
+        self.pixel_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            mode_frame,
+            text="Cache de Pixels",
+            variable=self.pixel_cache_var
+        ).pack(fill='x')
+
         quality_label = ttk.Label(settings_frame_quality, text="Qualidade da Imagem (%):")
         quality_label.pack(pady=5)
         self.quality_var = tk.StringVar(value="85")
@@ -172,6 +199,27 @@ class ImageProcessorGUI:
         )
         self.quality_spinbox.pack(pady=5)
 
+        ttk.Label(settings_frame_quality, text="Perfil de Esforço:").pack(pady=5)
+        self.effort_var = tk.StringVar(value=DEFAULT_PROFILE)
+        ttk.Combobox(
+            settings_frame_quality,
+            textvariable=self.effort_var,
+            values=list(EFFORT_PROFILES),
+            state='readonly',
+            width=10
+        ).pack(pady=5)
+
+        # Dieta de bytes (vazio desativa)
+        ttk.Label(settings_frame_quality, text="Dieta de Bytes:").pack(pady=5)
+        self.diet_var = tk.StringVar(value='')
+        ttk.Combobox(
+            settings_frame_quality,
+            textvariable=self.diet_var,
+            values=[''] + list(DIET_POLICIES),
+            state='readonly',
+            width=10
+        ).pack(pady=5)
+
         self.process_button = ttk.Button(self.basic_frame, text="Confirmar", command=lambda: threading.Thread(target=self.start_processing).start())
         self.process_button.pack(pady=20)
 
@@ -220,6 +268,28 @@ class ImageProcessorGUI:
         )
         converter_format_dropdown.pack(side='left', padx=5)
 
+        # Seleção do perfil de esforço
+        ttk.Label(format_frame, text="Esforço:").pack(side='left')
+        self.converter_effort_var = tk.StringVar(value=CONVERT_DEFAULT_PROFILE)
+        ttk.Combobox(
+            format_frame,
+            textvariable=self.converter_effort_var,
+            values=list(EFFORT_PROFILES),
+            state='readonly',
+            width=10
+        ).pack(side='left', padx=5)
+
+        # Dieta de bytes (vazio desativa)
+        ttk.Label(format_frame, text="Dieta de Bytes:").pack(side='left')
+        self.converter_diet_var = tk.StringVar(value='')
+        ttk.Combobox(
+            format_frame,
+            textvariable=self.converter_diet_var,
+            values=[''] + list(DIET_POLICIES),
+            state='readonly',
+            width=10
+        ).pack(side='left', padx=5)
+
         # Botão de conversão
         convert_button = ttk.Button(
             converter_main_frame, 
@@ -241,6 +311,8 @@ class ImageProcessorGUI:
 
         # Obter formato de saída
         output_format = self.converter_format_var.get()
+        effort = self.converter_effort_var.get()
+        diet = self.converter_diet_var.get() or None
 
         # Validar entrada
         if not input_directory:
@@ -254,7 +326,9 @@ class ImageProcessorGUI:
                 conversion.convert_images(
                    input_directory, 
                     output_format, 
-                    log_callback=self.converter_log_frame.update_log
+                    log_callback=self.converter_log_frame.update_log,
+                    effort=effort,
+                    diet=diet
                 )
             except Exception as e:
                 self.root.after(0, lambda: self.converter_log_frame.update_log(
@@ -298,6 +372,45 @@ class ImageProcessorGUI:
        )
         recursive_check.pack(side='left', padx=5)
 
+        # Checkbox para quantização de paleta em PNG
+        self.png_quantize_var = tk.BooleanVar(value=False)
+        png_quantize_check = ttk.Checkbutton(
+            options_frame,
+            text="PNG com Paleta",
+            variable=self.png_quantize_var
+        )
+        png_quantize_check.pack(side='left', padx=5)
+
+        # Checkbox para dithering na quantização
+        self.dither_var = tk.BooleanVar(value=True)
+        dither_check = ttk.Checkbutton(
+            options_frame,
+            text="Dithering",
+            variable=self.dither_var
+        )
+        dither_check.pack(side='left', padx=5)
+
+        # Seleção do perfil de esforço
+        self.compress_effort_var = tk.StringVar(value=DEFAULT_PROFILE)
+        ttk.Combobox(
+            options_frame,
+            textvariable=self.compress_effort_var,
+            values=list(EFFORT_PROFILES),
+            state='readonly',
+            width=10
+        ).pack(side='left', padx=5)
+
+        # Dieta de bytes (vazio desativa)
+        ttk.Label(options_frame, text="Dieta de Bytes:").pack(side='left')
+        self.compress_diet_var = tk.StringVar(value='')
+        ttk.Combobox(
+            options_frame,
+            textvariable=self.compress_diet_var,
+            values=[''] + list(DIET_POLICIES),
+            state='readonly',
+            width=10
+        ).pack(side='left', padx=5)
+
         # Botão de compressão
         compress_button = ttk.Button(
             compress_main_frame, 
@@ -318,6 +431,11 @@ class ImageProcessorGUI:
         if not input_directory:
             self.compress_log_frame.update_log("Selecione um diretório de entrada", "ERROR")
             return
+
+        png_quantize = self.png_quantize_var.get()
+        dither = self.dither_var.get()
+        effort = self.compress_effort_var.get()
+        diet = self.compress_diet_var.get() or None
     
         # Função para executar a compressão em uma thread separada
         def run_compression():
@@ -328,7 +446,11 @@ class ImageProcessorGUI:
                 # Chamar a função de compressão com callback de log
                 process_directory_recursive(
                     input_directory, 
-                    log_callback=self.compress_log_frame.update_log
+                    log_callback=self.compress_log_frame.update_log,
+                    png_quantize=png_quantize,
+                    dither=dither,
+                    effort=effort,
+                    diet=diet
                 )
             except Exception as e:
                 # Atualizar log de erro na thread principal
@@ -388,10 +510,16 @@ class ImageProcessorGUI:
         width = int(self.width_var.get()) if self.width_var.get() else 0
         height = int(self.height_var.get()) if self.height_var.get() else 0
         quality = int(self.quality_var.get()) if self.quality_var.get() else 85
+        effort = self.effort_var.get()
+        output_mode = self.output_mode_var.get()
+        diet = self.diet_var.get() or None
+        cache_dir = DEFAULT_CACHE_DIR if self.pixel_cache_var.get() else None
+        incremental = self.incremental_var.get()
 
         try:
             self.processor.process_images(
-                input_dir, output_dir, width, height, None, self.update_progress, quality
+                input_dir, output_dir, width, height, None, self.update_progress, quality, effort,
+                output_mode=output_mode, incremental=incremental, diet=diet, cache_dir=cache_dir
             )
             if not self.stop_flag:
                 self.root. after(0, self.processing_complete)
@@ -1,4 +1,7 @@
 import os
+import io
+import json
+import shutil
 from pathlib import Path
 from typing import Dict, Optional, Callable
 from PIL import Image
@@ -7,6 +10,19 @@ import concurrent.futures
 import time
 import logging
 import argparse
+import profiling
+import slice_manifest
+import byte_diet
+from pixel_cache import PixelCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, normalized_mode
+from codec_registry import open_image, save_image
+from encoding_profiles import DEFAULT_PROFILE, EFFORT_PROFILES, save_options
+
+# Modos de saída das fatias: arquivos soltos, atlas alto ou contêiner único
+OUTPUT_MODES = ('files', 'atlas', 'pack')
+
+# Altura máxima suportada por formato (limite do codificador)
+FORMAT_MAX_HEIGHT = {'WEBP': 16383, 'JPEG': 65535, 'GIF': 65535, 'PNG': 2 ** 31 - 1, 'BMP': 2 ** 31 - 1,
+                     'TIFF': 2 ** 32 - 1}
 
 class GuiLoggingHandler(logging.Handler):
     def __init__(self, update_func):
@@ -26,7 +42,10 @@ class GuiLoggingHandler(logging.Handler):
             "Imagens processadas com sucesso",
             "Imagens que falharam",
             "Falha ao processar",
-            "Processamento interrompido"
+            "Processamento interrompido",
+            "Fatias reaproveitadas",
+            "Dieta de bytes",
+            "Cache de pixels"
         ]
         
         if any(phrase in log_message for phrase in relevant_phrases):
@@ -41,6 +60,10 @@ class ImageProcessor:
         self.failure_count = 0
         self.failed_images = []
         self.quality = 85
+        self.effort = DEFAULT_PROFILE
+        self.diet = None
+        self.diet_stats = byte_diet.DietStats()
+        self.pixel_cache = None
 
     def find_image_files(self, input_folder: str):
         """Mapeia todas as imagens e suas localizações."""
@@ -58,11 +81,42 @@ class ImageProcessor:
         return images
 
     def process_images(self, input_folder: str, output_folder: str, width: int, slice_height: int, 
-                      output_format: Optional[str], update_progress_callback: Callable, quality: int = 85):
+                      output_format: Optional[str], update_progress_callback: Callable, quality: int = 85,
+                      effort: str = DEFAULT_PROFILE, dry_run: bool = False, profile: Optional[str] = None,
+                      output_mode: str = 'files', incremental: bool = False, diet: Optional[str] = None,
+                      cache_dir: Optional[str] = None, cache_max_mb: int = DEFAULT_MAX_MB, cache_full: bool = False):
         """
-        Processa as imagens com a qualidade especificada.
+        Processa as imagens com a qualidade e o perfil de esforço especificados.
+        Com `dry_run`, apenas estima tempo, bytes e memória sem gravar saídas.
+        Com `profile`, grava `<profile>.prof` e `<profile>.json` ao final.
+        `output_mode` escolhe entre fatias soltas ('files'), atlas alto ('atlas')
+        ou um único contêiner com índice de intervalos de bytes ('pack').
+        Com `incremental`, refaz apenas as fatias afetadas por origens alteradas.
+        `diet` ativa a dieta de bytes com a política de metadados indicada.
+        Com `cache_dir`, os pixels decodificados e redimensionados ficam em um
+        cache em disco de até `cache_max_mb` MB, reaproveitado nas próximas
+        execuções; `cache_full` guarda a resolução original, útil ao variar a largura.
         """
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Modo de saída desconhecido: {output_mode}")
+        if output_mode == 'atlas' and output_format:
+            max_height = FORMAT_MAX_HEIGHT.get(output_format.upper(), 65535)
+            if slice_height > max_height:
+                raise ValueError(f"Altura de corte {slice_height}px excede o limite de {max_height}px do "
+                                 f"{output_format.upper()} no modo atlas")
         self.quality = quality
+        self.effort = effort
+        self.diet = diet
+        self.diet_stats = byte_diet.DietStats()
+
+        if dry_run:
+            from estimator import estimate_run, format_estimate
+            estimate = estimate_run(input_folder, 'slice', width=width, output_format=output_format,
+                                    quality=quality, effort=effort, diet=diet)
+            for line in format_estimate(estimate):
+                self.logger.info(line)
+            return estimate
+
         images_map = self.find_image_files(input_folder)
         total_images = sum(len(files) for files in images_map.values())
 
@@ -71,110 +125,436 @@ class ImageProcessor:
             return
 
         os.makedirs(output_folder, exist_ok=True)
+        self.pixel_cache = PixelCache(cache_dir, cache_max_mb * 1024 * 1024, not cache_full) if cache_dir else None
 
         processed_count = 0
         start_time = time.time()
 
-        self.logger.info(f"Início do processamento: {time.strftime('%H:%M:%S', time.localtime(start_time))}")
-        self.logger.info(f"Total de imagens a processar: {total_images}")
+        # Perfilamento opcional (cProfile + tracemalloc); desligado não tem custo
+        profiler = profiling.RunProfiler(profile).start() if profile else None
+
+        try:
+            self.logger.info(f"Início do processamento: {time.strftime('%H:%M:%S', time.localtime(start_time))}")
+            self.logger.info(f"Total de imagens a processar: {total_images}")
+
+            for relative_path, files in images_map.items():
+                if self.stop_flag:
+                    self.logger.info("Processamento interrompido pelo usuário.")
+                    break
+
+                output_path = Path(output_folder) / relative_path
+                self.process_folder(files, output_path, width, slice_height, output_format, output_mode, profiler,
+                                    incremental)
+
+                processed_count += len(files)
+                if processed_count % 5 == 0 or processed_count == total_images:
+                    elapsed_time = time.time() - start_time
+                    self.logger.info(f"Processado: {processed_count}/{total_images} imagens - Tempo decorrido: {elapsed_time:.1f}s")
+                    progress_value = (processed_count / total_images) * 100
+                    update_progress_callback(progress_value)
+
+            end_time = time.time()
+            processing_time = end_time - start_time
 
-        for relative_path, files in images_map.items():
             if self.stop_flag:
-                self.logger.info("Processamento interrompido pelo usuário.")
-                break
+                self.logger.info("Processamento interrompido pelo usuário")
+            else:
+                self.logger.info(f"Processamento concluído em {processing_time:.1f} segundos")
+                self.logger.info(f"Imagens processadas com sucesso: {self.success_count}")
+                self.logger.info(f"Imagens que falharam: {self.failure_count}")
+                if diet:
+                    for line in self.diet_stats.summary_lines():
+                        self.logger.info(line)
+                if self.pixel_cache:
+                    self.logger.info(self.pixel_cache.summary())
+        finally:
+            # Mesmo com erro no meio da execução, desliga o cProfile e o tracemalloc
+            if profiler:
+                summary = profiler.stop()
+                self.logger.info(f"Perfil salvo em: {summary['prof_path']} e {summary['json_path']}")
+
+    def process_folder(self, files, output_path: Path, width: int, slice_height: int,
+                       output_format: Optional[str], output_mode: str = 'files', profiler=None,
+                       incremental: bool = False):
+        """
+        Redimensiona as imagens de uma pasta e grava as fatias (ou as imagens) em
+        `output_path`. Devolve a lista de arquivos gravados.
+        """
+        if incremental and output_mode == 'files' and slice_height > 0:
+            return self._process_folder_incremental(files, output_path, width, slice_height, output_format,
+                                                    profiler)
+        if incremental:
+            self.logger.info(f"Modo incremental disponível apenas para fatias em arquivos: {output_path}")
+
+        output_path.mkdir(parents=True, exist_ok=True)
+        written = []
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            # Lista para armazenar as imagens processadas
+            processed_images = []
+            
+            for file in files:
+                if self.stop_flag:
+                    break
+                    
+                try:
+                    with profiling.measure(profiler, file):
+                        processed_images.append(self.load_resized(file, width))
+                except Exception as e:
+                    self.failed_images.append(file)
+                    self.logger.error(f"Falha ao processar a imagem {file}: {e}")
+                    self.failure_count += 1
+                    continue
+
+            if slice_height > 0 and not self.stop_flag and processed_images:
+                # Calcula altura total
+                total_height = sum(img.height for img in processed_images)
+                strip = Image.new('RGB', (width, total_height))
+
+                current_height = 0
+                for img in processed_images:
+                    if self.stop_flag:
+                        break
+                    strip.paste(img, (0, current_height))
+                    current_height += img.height
 
-            output_path = Path(output_folder) / relative_path
-            output_path.mkdir(parents=True, exist_ok=True)
+                if output_mode == 'atlas':
+                    return self._write_atlas(strip, output_path, slice_height, files, output_format)
+                elif output_mode == 'pack':
+                    return self._write_pack(strip, output_path, slice_height, files, output_format)
 
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                # Lista para armazenar as imagens processadas
-                processed_images = []
-                
-                for file in files:
+                # Fatiamento
+                for i in range(0, strip.height, slice_height):
                     if self.stop_flag:
                         break
-                        
-                    try:
-                        with Image.open(file) as img:
-                            if self.stop_flag:
-                                break
-                            resized_img = img.resize(
-                                (width, int((width / img.width) * img.height)),
-                                Image.Resampling.LANCZOS
-                            )
-                            processed_images.append(resized_img)
-                    except Exception as e:
-                        self.failed_images.append(file)
-                        self.logger.error(f"Falha ao processar a imagem {file}: {e}")
-                        self.failure_count += 1
+                    box = (0, i, strip.width, min(i + slice_height, strip.height))
+                    slice_image = strip.crop(box)
+                    slice_file = self._slice_file(output_path, i // slice_height, files[0].suffix.lower())
+                    with profiling.measure(profiler, slice_file):
+                        if self._save_image(slice_image, slice_file, output_format):
+                            written.append(slice_file)
+            else:
+                # Salvar imagens individuais
+                for img, file in zip(processed_images, files):
+                    if self.stop_flag:
+                        break
+                    if img:
+                        with profiling.measure(profiler, output_path / file.name):
+                            if self._save_image(img, output_path / file.name, output_format):
+                                written.append(output_path / file.name)
+
+        return written
+
+    def _slice_file(self, output_path: Path, index: int, suffix: str):
+        return output_path / f"slice_{index}.{suffix}"
+
+    def _process_folder_incremental(self, files, output_path: Path, width: int, slice_height: int,
+                                    output_format: Optional[str], profiler=None):
+        """
+        Refaz apenas as fatias cujas faixas cobrem origens alteradas ou inseridas,
+        comparando com o manifesto da execução anterior. Fatias com o mesmo
+        conteúdo de uma anterior são reaproveitadas e, se a altura acumulada
+        mudou, apenas renumeradas. Devolve todas as fatias da pasta.
+        """
+        output_path.mkdir(parents=True, exist_ok=True)
+        suffix = files[0].suffix.lower()
+        settings = {'width': width, 'slice_height': slice_height, 'output_format': output_format,
+                    'quality': self.quality, 'effort': self.effort, 'diet': self.diet, 'suffix': suffix}
+
+        manifest = slice_manifest.load_manifest(output_path)
+        previous_by_name = {source['name']: source for source in manifest['sources']} if manifest else {}
+        old_sources = manifest['sources'] if manifest and manifest['settings'] == settings else []
+        if manifest and not old_sources:
+            self.logger.info(f"Configuração alterada, refazendo todas as fatias: {output_path}")
+        known_heights = {source['hash']: source['height'] for source in old_sources}
+
+        # Só as origens novas ou alteradas são decodificadas aqui
+        sources, source_files, decoded = [], [], {}
+        for file in files:
+            if self.stop_flag:
+                return []
+            try:
+                entry = slice_manifest.source_entry(file, previous_by_name)
+                if entry['hash'] not in known_heights and entry['hash'] not in decoded:
+                    with profiling.measure(profiler, file):
+                        decoded[entry['hash']] = self.load_resized(file, width)
+            except Exception as e:
+                self.failed_images.append(file)
+                self.logger.error(f"Falha ao processar a imagem {file}: {e}")
+                self.failure_count += 1
+                continue
+            entry['height'] = known_heights[entry['hash']] if entry['hash'] in known_heights \
+                else decoded[entry['hash']].height
+            sources.append(entry)
+            source_files.append(file)
+
+        if not sources:
+            return []
+
+        old_signatures = {}
+        for index, signature in enumerate(slice_manifest.slice_signatures(old_sources, slice_height)):
+            if self._slice_file(output_path, index, suffix).exists():
+                old_signatures.setdefault(signature, index)
+
+        reuse, dirty = {}, []
+        new_signatures = slice_manifest.slice_signatures(sources, slice_height)
+        for index, signature in enumerate(new_signatures):
+            if signature in old_signatures:
+                reuse[index] = old_signatures[signature]
+            else:
+                dirty.append(index)
+        self.logger.info(f"Fatias reaproveitadas: {len(reuse)}, a refazer: {len(dirty)} em {output_path}")
+
+        # Sem manifesto enquanto as fatias estão sendo alteradas
+        slice_manifest.remove_manifest(output_path)
+
+        # Renumeração em duas etapas, para não sobrescrever uma fatia ainda não movida
+        targets = {}
+        for new, old in reuse.items():
+            targets.setdefault(old, []).append(new)
+        staged = {}
+        for old, news in targets.items():
+            if old not in news:
+                staged[old] = output_path / f".slice_{old}.tmp"
+                os.replace(self._slice_file(output_path, old, suffix), staged[old])
+        for old, news in targets.items():
+            source = staged.get(old, self._slice_file(output_path, old, suffix))
+            copies = [new for new in news if new != old]
+            for new in copies[:-1]:
+                shutil.copyfile(source, self._slice_file(output_path, new, suffix))
+            if old in staged:
+                os.replace(source, self._slice_file(output_path, copies[-1], suffix))
+            elif copies:
+                shutil.copyfile(source, self._slice_file(output_path, copies[-1], suffix))
+
+        # Fatias que sobraram da execução anterior
+        if manifest:
+            for index in range(len(new_signatures), manifest['slice_count']):
+                old_file = self._slice_file(output_path, index, manifest['settings']['suffix'])
+                if old_file.exists():
+                    os.remove(old_file)
+
+        # Refaz as faixas contíguas de fatias sujas, decodificando só as origens que as cobrem
+        offsets = [0]
+        for entry in sources:
+            offsets.append(offsets[-1] + entry['height'])
+        total_height = offsets[-1]
+        failures_before = self.failure_count
+
+        runs = []
+        for index in dirty:
+            if runs and runs[-1][1] == index:
+                runs[-1][1] = index + 1
+            else:
+                runs.append([index, index + 1])
+
+        for first, last in runs:
+            if self.stop_flag:
+                break
+            top = first * slice_height
+            bottom = min(last * slice_height, total_height)
+            band = Image.new('RGB', (width, bottom - top))
+            try:
+                for entry, file, offset, end in zip(sources, source_files, offsets, offsets[1:]):
+                    if end <= top or offset >= bottom or not entry['height']:
                         continue
+                    if entry['hash'] not in decoded:
+                        with profiling.measure(profiler, file):
+                            decoded[entry['hash']] = self.load_resized(file, width)
+                    band.paste(decoded[entry['hash']], (0, offset - top))
+            except Exception as e:
+                self.failed_images.append(file)
+                self.logger.error(f"Falha ao processar a imagem {file}: {e}")
+                self.failure_count += 1
+                break
+
+            for index in range(first, last):
+                if self.stop_flag:
+                    break
+                y = index * slice_height - top
+                slice_file = self._slice_file(output_path, index, suffix)
+                with profiling.measure(profiler, slice_file):
+                    self._save_image(band.crop((0, y, width, min(y + slice_height, band.height))), slice_file,
+                                     output_format)
+
+        # O manifesto só é gravado se todas as fatias estão em dia
+        if not self.stop_flag and self.failure_count == failures_before:
+            slice_manifest.save_manifest(output_path, settings, sources, len(new_signatures))
+        return [self._slice_file(output_path, index, suffix) for index in range(len(new_signatures))]
+
+    def _container_format(self, files, output_format: Optional[str]):
+        """Formato e extensão usados pelos modos de contêiner."""
+        if output_format:
+            return output_format.upper(), '.' + output_format.lower()
+        extension = files[0].suffix.lower()
+        return Image.registered_extensions().get(extension, 'PNG'), extension
+
+    def _write_index(self, output_path: Path, index: dict):
+        index_file = output_path / 'slices.json'
+        temp_path = output_path / 'slices.json.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(temp_path, index_file)
+        return index_file
 
-                if slice_height > 0 and not self.stop_flag and processed_images:
-                    # Calcula altura total
-                    total_height = sum(img.height for img in processed_images)
-                    strip = Image.new('RGB', (width, total_height))
-
-                    current_height = 0
-                    for img in processed_images:
-                        if self.stop_flag:
-                            break
-                        strip.paste(img, (0, current_height))
-                        current_height += img.height
-
-                    # Fatiamento
-                    for i in range(0, strip.height, slice_height):
-                        if self.stop_flag:
-                            break
-                        box = (0, i, strip.width, min(i + slice_height, strip.height))
-                        slice_image = strip.crop(box)
-                        slice_file = output_path / f"slice_{i // slice_height}.{files[0].suffix.lower()}"
-                        self._save_image(slice_image, slice_file, output_format)
-                else:
-                    # Salvar imagens individuais
-                    for img, file in zip(processed_images, files):
-                        if self.stop_flag:
-                            break
-                        if img:
-                            self._save_image(img, output_path / file.name, output_format)
-
-            processed_count += len(files)
-            if processed_count % 5 == 0 or processed_count == total_images:
-                elapsed_time = time.time() - start_time
-                self.logger.info(f"Processado: {processed_count}/{total_images} imagens - Tempo decorrido: {elapsed_time:.1f}s")
-                progress_value = (processed_count / total_images) * 100
-                update_progress_callback(progress_value)
-
-        end_time = time.time()
-        processing_time = end_time - start_time
-
-        if self.stop_flag:
-            self.logger.info("Processamento interrompido pelo usuário")
-        else:
-            self.logger.info(f"Processamento concluído em {processing_time:.1f} segundos")
-            self.logger.info(f"Imagens processadas com sucesso: {self.success_count}")
-            self.logger.info(f"Imagens que falharam: {self.failure_count}")
+    def _write_atlas(self, strip: Image.Image, output_path: Path, slice_height: int, files,
+                     output_format: Optional[str]):
+        """Grava a tira em atlas altos, divididos no limite de altura do formato."""
+        format_to_save, extension = self._container_format(files, output_format)
+        max_height = FORMAT_MAX_HEIGHT.get(format_to_save, 65535)
+        if slice_height > max_height:
+            # Nenhuma fatia caberia em um atlas (formato deduzido da origem)
+            self.logger.error(f"Altura de corte {slice_height}px excede o limite de {max_height}px do "
+                              f"{format_to_save}: {output_path}")
+            self.failure_count += 1
+            return []
+        # Cada atlas contém um número inteiro de fatias
+        atlas_height = (max_height // slice_height) * slice_height
+
+        atlases = []
+        slices = []
+        for atlas_number, top in enumerate(range(0, strip.height, atlas_height)):
+            if self.stop_flag:
+                break
+            bottom = min(top + atlas_height, strip.height)
+            atlas_file = output_path / f"atlas_{atlas_number}{extension}"
+            try:
+                self.encode_image(strip.crop((0, top, strip.width, bottom)), atlas_file, format_to_save)
+            except Exception as e:
+                self.logger.error(f"Falha ao salvar imagem {atlas_file}: {e}")
+                self.failure_count += 1
+                continue
+            atlases.append([atlas_file.name, os.path.getsize(atlas_file), bottom - top])
+            # `atlas` é a posição na lista `atlases`, que omite os atlas que falharam
+            atlas_index = len(atlases) - 1
+            for y in range(top, bottom, slice_height):
+                slices.append([atlas_index, y - top, min(slice_height, bottom - y)])
+                self.success_count += 1
+
+        index_file = self._write_index(output_path, {
+            'mode': 'atlas',
+            'format': format_to_save,
+            'width': strip.width,
+            'slice_height': slice_height,
+            'atlas_fields': ['file', 'bytes', 'height'],
+            'atlases': atlases,
+            'slice_fields': ['atlas', 'y', 'height'],
+            'slices': slices,
+        })
+        self.logger.info(f"Atlas salvo com {len(slices)} fatias: {output_path}")
+        return [output_path / atlas[0] for atlas in atlases] + [index_file]
+
+    def _write_pack(self, strip: Image.Image, output_path: Path, slice_height: int, files,
+                    output_format: Optional[str]):
+        """
+        Grava todas as fatias, codificadas de forma independente, em um único
+        arquivo sequencial. O índice traz o intervalo de bytes de cada fatia,
+        permitindo buscá-las com requisições HTTP Range.
+        """
+        format_to_save, _ = self._container_format(files, output_format)
+        pack_file = output_path / 'slices.pack'
+        # Grava em um temporário: o contêiner só recebe o nome final quando completo
+        temp_path = output_path / 'slices.pack.tmp'
+
+        slices = []
+        offset = 0
+        with open(temp_path, 'wb') as pack:
+            for i in range(0, strip.height, slice_height):
+                if self.stop_flag:
+                    break
+                box = (0, i, strip.width, min(i + slice_height, strip.height))
+                buffer = io.BytesIO()
+                try:
+                    self.encode_image(strip.crop(box), buffer, format_to_save)
+                except Exception as e:
+                    self.logger.error(f"Falha ao salvar fatia {i // slice_height} em {pack_file}: {e}")
+                    self.failure_count += 1
+                    continue
+                data = buffer.getbuffer()
+                pack.write(data)
+                slices.append([offset, len(data), i, box[3] - i])
+                offset += len(data)
+                self.success_count += 1
+        os.replace(temp_path, pack_file)
+
+        index_file = self._write_index(output_path, {
+            'mode': 'pack',
+            'file': pack_file.name,
+            'format': format_to_save,
+            'mime': Image.MIME.get(format_to_save, 'application/octet-stream'),
+            'width': strip.width,
+            'slice_height': slice_height,
+            'slice_fields': ['offset', 'length', 'y', 'height'],
+            'slices': slices,
+        })
+        self.logger.info(f"Contêiner salvo com {len(slices)} fatias: {pack_file}")
+        return [pack_file, index_file]
+
+    def load_resized(self, file: Path, width: int) -> Image.Image:
+        """
+        Decodifica uma origem e a redimensiona; com a dieta de bytes, aplica
+        orientação e sRGB. Com o cache de pixels ativo, um acerto devolve a
+        imagem mapeada do disco, somente leitura, sem decodificar.
+        """
+        cache = self.pixel_cache
+        if cache:
+            key = cache.key(file, width, self.diet)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached if cache.resized else self.resize_image(cached, width)
+
+        with open_image(file, metadata=bool(self.diet)) as img:
+            if self.diet:
+                img, _ = byte_diet.prepare(img, self.diet)
+            # Modo fixo antes do redimensionamento: paleta e 1 bit seriam reduzidos com
+            # NEAREST, e o cache guarda pixels já convertidos; acerto e falta ficam iguais
+            mode = normalized_mode(img)
+            if img.mode != mode:
+                img = img.convert(mode)
+            if cache and not cache.resized:
+                cache.put(key, img)
+            resized = self.resize_image(img, width)
+        if cache and cache.resized:
+            cache.put(key, resized)
+        return resized
+
+    def resize_image(self, img: Image.Image, width: int) -> Image.Image:
+        """Redimensiona a imagem para a largura informada, mantendo a proporção."""
+        return img.resize(
+            (width, int((width / img.width) * img.height)),
+            Image.Resampling.LANCZOS
+        )
+
+    def encode_image(self, image: Image.Image, target, format_to_save: Optional[str]):
+        """Codifica a imagem em `target` (caminho ou buffer) com a qualidade e o perfil atuais."""
+        if format_to_save == 'JPEG' or image.mode == 'RGBX':
+            # RGBX vem do cache de pixels e não é aceito pelos codificadores
+            image = image.convert('RGB')
+        options = save_options(format_to_save, self.quality, self.effort) if format_to_save else {}
+        if self.diet and format_to_save:
+            # Metadados e croma conforme a política (as fatias não herdam metadados das origens)
+            report = {}
+            image, options = byte_diet.apply(image, format_to_save, options, self.diet, report=report)
+            self.diet_stats.add(report)
+        save_image(image, target, format_to_save, **options)
 
     def _save_image(self, image: Image.Image, file_path: Path, output_format: Optional[str] = None):
-        """Salva a imagem processada com as configurações especificadas."""
+        """Salva a imagem processada com as configurações especificadas; devolve True se gravou."""
         format_to_save = output_format.upper() if output_format else image.format
+        if not format_to_save:
+            # Recortes não herdam o formato: usa a extensão do arquivo de destino
+            format_to_save = Image.registered_extensions().get(file_path.suffix.lower())
         
         try:
-            if format_to_save == 'JPEG':
-                image = image.convert('RGB')
-                image.save(file_path, format_to_save, quality=self.quality, optimize=True, progressive=True)
-            elif format_to_save == 'PNG':
-                compress_level = max(0, min(9, int(9 - (self.quality / 11.111))))
-                image.save(file_path, format_to_save, optimize=True, compress_level=compress_level)
-            elif format_to_save == 'WEBP':
-                image.save(file_path, format_to_save, quality=self.quality, optimize=True)
-            else:
-                image.save(file_path, format_to_save)
+            self.encode_image(image, file_path, format_to_save)
 
             self.logger.info(f"Imagem salva com qualidade {self.quality}%: {file_path}")
             self.success_count += 1
+            return True
         except Exception as e:
             self.logger.error(f"Falha ao salvar imagem {file_path}: {e}")
             self.failure_count += 1
+            return False
 
     def stop_processing(self):
         """Interrompe o processamento de imagens."""
@@ -189,6 +569,24 @@ if __name__ == "__main__":
     parser.add_argument("--slice_height", type=int, default=600, help="Altura de fatiamento das imagens")
     parser.add_argument("--output_format", type=str, choices=['jpeg', 'png', 'webp'], help="Formato de saída das imagens")
     parser.add_argument("--quality", type=int, default=85, help="Qualidade da imagem (1-100)")
+    parser.add_argument("--effort", type=str, choices=list(EFFORT_PROFILES), default=DEFAULT_PROFILE,
+                        help="Perfil de esforço do codificador")
+    parser.add_argument("--dry-run", action='store_true',
+                        help="Apenas estima tempo, espaço e memória, sem gravar saídas")
+    parser.add_argument("--profile", nargs='?', const='nextsmart-profile', default=None,
+                        help="Gera <prefixo>.prof e <prefixo>.json com cProfile e tracemalloc")
+    parser.add_argument("--output_mode", type=str, choices=list(OUTPUT_MODES), default='files',
+                        help="Fatias em arquivos soltos, em atlas altos ou em um contêiner único com índice")
+    parser.add_argument("--diet", choices=byte_diet.DIET_POLICIES, default=None,
+                        help="Dieta de bytes: orientação EXIF, política de metadados e croma por conteúdo")
+    parser.add_argument("--cache_dir", nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Cache em disco dos pixels decodificados, reaproveitado entre execuções")
+    parser.add_argument("--cache_max_mb", type=int, default=DEFAULT_MAX_MB,
+                        help="Tamanho máximo do cache de pixels em MB")
+    parser.add_argument("--cache_full", action='store_true',
+                        help="Guarda no cache a resolução original, para variar a largura sem decodificar")
+    parser.add_argument("--incremental", action='store_true',
+                        help="Refaz apenas as fatias afetadas por imagens alteradas desde a última execução")
 
     args = parser.parse_args()
 
@@ -205,5 +603,14 @@ if __name__ == "__main__":
         args.slice_height,
         args.output_format,
         dummy_progress_callback,
-        quality=args.quality
+        quality=args.quality,
+        effort=args.effort,
+        dry_run=args.dry_run,
+        profile=args.profile,
+        output_mode=args.output_mode,
+        incremental=args.incremental,
+        diet=args.diet,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        cache_full=args.cache_full
     )
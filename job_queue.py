@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import compress
+import conversion
+from image_processor import ImageProcessor, OUTPUT_MODES
+from encoding_profiles import DEFAULT_PROFILE, CONVERT_DEFAULT_PROFILE, EFFORT_PROFILES
+from byte_diet import DIET_POLICIES
+from codec_registry import ensure_benchmarked
+
+# Fila de trabalho em SQLite para distribuir compress/convert/slice entre várias
+# máquinas que compartilham o mesmo armazenamento. Usa o journal padrão
+# (rollback) porque o modo WAL não funciona em sistemas de arquivos de rede.
+
+OPERATIONS = ('compress', 'convert', 'slice')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    files TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_config(conn):
+    return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM config")}
+
+def enqueue(db_path, operation, input_dir, output_dir=None, **options):
+    """
+    Enumera a árvore de entrada e registra um job por arquivo (compress/convert)
+    ou por pasta (slice). Pode ser executado de novo: apenas itens novos entram.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Operação desconhecida: {operation}")
+
+    input_dir = os.path.abspath(input_dir.strip('"'))
+    if output_dir is None:
+        if operation == 'slice':
+            raise ValueError("O fatiamento exige um diretório de saída")
+        output_dir = input_dir + ("-optimized" if operation == 'compress' else "-converted")
+    output_dir = os.path.abspath(output_dir)
+
+    jobs = []
+    if operation == 'slice':
+        # Um job por pasta, preservando a ordem usada pelo processamento local
+        processor = ImageProcessor(logging.getLogger(__name__))
+        for relative_path, files in processor.find_image_files(input_dir).items():
+            jobs.append((str(relative_path), json.dumps([str(f.relative_to(input_dir)) for f in files])))
+    else:
+        supported_formats = compress.SUPPORTED_FORMATS if operation == 'compress' else conversion.SUPPORTED_FORMATS
+        for root, _, files in os.walk(input_dir):
+            for filename in files:
+                if filename.lower().endswith(supported_formats):
+                    jobs.append((os.path.relpath(os.path.join(root, filename), input_dir), None))
+
+    config = {'operation': operation, 'input_dir': input_dir, 'output_dir': output_dir, 'options': options}
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in config.items()]
+        )
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO jobs (path, files) VALUES (?, ?)", jobs)
+        added = conn.total_changes - before
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return added
+
+def lease_jobs(conn, owner, batch_size, lease_seconds, max_attempts):
+    """Reserva um lote de jobs pendentes ou com reserva expirada."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Jobs pendentes ou com reserva expirada que já esgotaram as tentativas (inclusive
+        # pelo limite de outro worker) viram falha definitiva, senão ficariam na fila para sempre
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', lease_owner = NULL, lease_expires = NULL, "
+            "error = COALESCE(error, CASE state WHEN 'pending' THEN 'Tentativas esgotadas' ELSE 'Reserva expirada' END) "
+            "WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) AND attempts >= ?",
+            (now, max_attempts)
+        )
+        rows = conn.execute(
+            "SELECT id, path, files FROM jobs "
+            "WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) AND attempts < ? "
+            "ORDER BY id LIMIT ?",
+            (now, max_attempts, batch_size)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+            "WHERE id = ?",
+            [(owner, now + lease_seconds, job_id) for job_id, _, _ in rows]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+def renew_lease(conn, owner, lease_seconds):
+    conn.execute(
+        "UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? AND state = 'leased'",
+        (time.time() + lease_seconds, owner)
+    )
+
+def _heartbeat(db_path, owner, lease_seconds, stop_event, logger):
+    """Renova as reservas do worker enquanto um job demorado é executado."""
+    # Conexão própria: conexões SQLite não são compartilhadas entre threads
+    conn = connect(db_path)
+    try:
+        while not stop_event.wait(lease_seconds / 3):
+            try:
+                renew_lease(conn, owner, lease_seconds)
+            except sqlite3.Error as e:
+                # Banco ocupado: tenta de novo no próximo intervalo, ainda dentro da reserva
+                logger.warning(f"Falha ao renovar a reserva de {owner}: {e}")
+    finally:
+        conn.close()
+
+def finish_job(conn, job_id, owner, error=None, max_attempts=3):
+    """Confirma o job; em caso de erro, devolve à fila até esgotar as tentativas."""
+    if error is None:
+        conn.execute(
+            "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL, error = NULL "
+            "WHERE id = ? AND lease_owner = ?",
+            (job_id, owner)
+        )
+    else:
+        conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_owner = NULL, lease_expires = NULL, error = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (max_attempts, error, job_id, owner)
+        )
+
+def queue_status(db_path):
+    conn = connect(db_path)
+    try:
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+    finally:
+        conn.close()
+    return {state: counts.get(state, 0) for state in ('pending', 'leased', 'done', 'failed')}
+
+def _run_job(config, processor, path, files):
+    """Executa um job com a lógica existente; devolve a mensagem de erro ou None."""
+    operation = config['operation']
+    options = config['options']
+    input_dir = Path(config['input_dir'])
+    output_dir = Path(config['output_dir'])
+    effort = options.get('effort') or (CONVERT_DEFAULT_PROFILE if operation == 'convert' else DEFAULT_PROFILE)
+    diet = options.get('diet')
+
+    if operation == 'slice':
+        failures_before = processor.failure_count
+        processor.process_folder(
+            [input_dir / f for f in json.loads(files)], output_dir / path,
+            options.get('width', 800), options.get('slice_height', 600), options.get('output_format'),
+            options.get('output_mode', 'files'), incremental=options.get('incremental', False)
+        )
+        if processor.failure_count > failures_before:
+            return f"{processor.failure_count - failures_before} falha(s) ao processar a pasta"
+        return None
+
+    file_path = str(input_dir / path)
+    if operation == 'compress':
+        output_directory = output_dir / os.path.dirname(path)
+        output_directory.mkdir(parents=True, exist_ok=True)
+        _, success, _, error = compress.compress_image(
+            file_path, str(output_directory), options.get('png_quantize', False), options.get('dither', True), effort,
+            diet
+        )
+    else:
+        # convert_image recria a estrutura relativa ao pai do diretório de saída
+        _, success, _, error = conversion.convert_image(
+            file_path, str(output_dir), options.get('output_format', 'jpeg'), effort, diet
+        )
+    return None if success else error
+
+def run_worker(db_path, worker_id=None, batch_size=8, lease_seconds=300, max_attempts=3, poll_interval=5,
+               input_dir=None, output_dir=None):
+    """
+    Processa jobs até a fila esvaziar. `input_dir`/`output_dir` substituem os
+    caminhos registrados quando o armazenamento está montado em outro lugar.
+    """
+    owner = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logger = logging.getLogger(__name__)
+    conn = connect(db_path)
+    config = load_config(conn)
+    if input_dir:
+        config['input_dir'] = os.path.abspath(input_dir)
+    if output_dir:
+        config['output_dir'] = os.path.abspath(output_dir)
+
+    processor = ImageProcessor(logger)
+    processor.quality = config['options'].get('quality', 85)
+    processor.effort = config['options'].get('effort') or DEFAULT_PROFILE
+    processor.diet = config['options'].get('diet')
+
+    done = failed = 0
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(db_path, owner, lease_seconds, stop_event, logger), daemon=True
+    )
+    heartbeat.start()
+    try:
+        while True:
+            rows = lease_jobs(conn, owner, batch_size, lease_seconds, max_attempts)
+            if not rows:
+                status = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+                if not status.get('pending') and not status.get('leased'):
+                    break
+                # Outros workers ainda têm reservas: aguarda concluírem ou expirarem
+                time.sleep(poll_interval)
+                continue
+
+            for job_id, path, files in rows:
+                try:
+                    error = _run_job(config, processor, path, files)
+                except Exception as e:
+                    error = str(e)
+                finish_job(conn, job_id, owner, error, max_attempts)
+                if error:
+                    failed += 1
+                    logger.error(f"Falha no job {path}: {error}")
+                else:
+                    done += 1
+    finally:
+        stop_event.set()
+        heartbeat.join()
+        conn.close()
+
+    logger.info(f"Worker {owner} concluído: {done} job(s) processado(s), {failed} falha(s)")
+    return done, failed
+
+def run_local_workers(db_path, count, **kwargs):
+    """Inicia `count` processos worker nesta máquina e aguarda todos terminarem."""
+    # Benchmark dos codecs uma única vez, antes de iniciar os processos
+    ensure_benchmarked()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(db_path,), kwargs=kwargs)
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fila de trabalho distribuída")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Enumera a árvore e cria os jobs")
+    enqueue_parser.add_argument("db", type=str, help="Arquivo SQLite da fila (no armazenamento compartilhado)")
+    enqueue_parser.add_argument("operation", choices=list(OPERATIONS), help="Operação a executar")
+    enqueue_parser.add_argument("input_dir", type=str, help="Diretório de entrada com imagens")
+    enqueue_parser.add_argument("--output_dir", type=str, default=None, help="Diretório de saída")
+    enqueue_parser.add_argument("--effort", type=str, choices=list(EFFORT_PROFILES), default=None,
+                                help=f"Perfil de esforço do codificador (padrão: {CONVERT_DEFAULT_PROFILE} na "
+                                     f"conversão, {DEFAULT_PROFILE} nas demais)")
+    enqueue_parser.add_argument("--png_quantize", action='store_true', help="Paleta quantizada para PNG (compress)")
+    enqueue_parser.add_argument("--no_dither", action='store_true', help="Desativa o dithering da quantização")
+    enqueue_parser.add_argument("--output_format", type=str, choices=['jpeg', 'jpg', 'png', 'webp'],
+                                help="Formato de saída (convert/slice)")
+    enqueue_parser.add_argument("--width", type=int, default=800, help="Largura-alvo (slice)")
+    enqueue_parser.add_argument("--slice_height", type=int, default=600, help="Altura de fatiamento (slice)")
+    enqueue_parser.add_argument("--quality", type=int, default=85, help="Qualidade da imagem (slice)")
+    enqueue_parser.add_argument("--output_mode", type=str, choices=list(OUTPUT_MODES), default='files',
+                                help="Modo de saída das fatias (slice)")
+    enqueue_parser.add_argument("--diet", choices=DIET_POLICIES, default=None,
+                                help="Dieta de bytes: orientação EXIF, política de metadados e croma por conteúdo")
+    enqueue_parser.add_argument("--incremental", action='store_true',
+                                help="Refaz apenas as fatias afetadas por imagens alteradas (slice)")
+
+    work_parser = subparsers.add_parser("work", help="Processa jobs até a fila esvaziar")
+    work_parser.add_argument("db", type=str, help="Arquivo SQLite da fila")
+    work_parser.add_argument("--workers", type=int, default=1, help="Quantidade de processos worker nesta máquina")
+    work_parser.add_argument("--batch", type=int, default=8, help="Jobs reservados por vez")
+    work_parser.add_argument("--lease", type=int, default=300, help="Duração da reserva em segundos")
+    work_parser.add_argument("--max_attempts", type=int, default=3, help="Tentativas antes de marcar falha")
+    work_parser.add_argument("--input_dir", type=str, default=None, help="Caminho local da entrada, se diferente")
+    work_parser.add_argument("--output_dir", type=str, default=None, help="Caminho local da saída, se diferente")
+
+    status_parser = subparsers.add_parser("status", help="Mostra a quantidade de jobs por estado")
+    status_parser.add_argument("db", type=str, help="Arquivo SQLite da fila")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "enqueue":
+        options = {'effort': args.effort, 'diet': args.diet}
+        if args.operation == 'compress':
+            options.update(png_quantize=args.png_quantize, dither=not args.no_dither)
+        elif args.operation == 'convert':
+            options['output_format'] = args.output_format or 'jpeg'
+        else:
+            options.update(width=args.width, slice_height=args.slice_height, quality=args.quality,
+                           output_format=args.output_format, output_mode=args.output_mode,
+                           incremental=args.incremental)
+        added = enqueue(args.db, args.operation, args.input_dir, args.output_dir, **options)
+        print(f"Jobs adicionados: {added}")
+    elif args.command == "work":
+        run_local_workers(
+            args.db, args.workers, batch_size=args.batch, lease_seconds=args.lease,
+            max_attempts=args.max_attempts, input_dir=args.input_dir, output_dir=args.output_dir
+        )
+    for state, count in queue_status(args.db).items():
+        print(f"{state}: {count}")
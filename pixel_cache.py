@@ -0,0 +1,165 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from PIL import Image
+from slice_manifest import file_hash
+
+# Cache em disco de pixels decodificados (por padrão, já redimensionados), para
+# repetir o fatiamento com outras configurações sem decodificar as origens de
+# novo. Cada entrada é um arquivo com cabeçalho fixo seguido dos pixels crus,
+# lido com mmap: o Pillow usa o buffer do cache de páginas sem copiar.
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.nextsmart', 'pixel-cache')
+DEFAULT_MAX_MB = 2048
+
+_HEADER = struct.Struct('<4sB3xII8s')
+_MAGIC = b'NSPX'
+_VERSION = 1
+_EXTENSION = '.px'
+
+# Modos que o Image.frombuffer mapeia sem cópia, com os bytes por pixel
+_MAPPED_MODES = {'L': 1, 'RGBX': 4, 'RGBA': 4}
+
+def normalized_mode(img):
+    """Modo fixo (L, RGB ou RGBA) em que as origens são redimensionadas, com ou sem cache."""
+    if 'A' in img.mode or 'transparency' in img.info:
+        return 'RGBA'
+    return 'L' if img.mode in ('1', 'L') else 'RGB'
+
+def _mapped_mode(img):
+    # RGB tem 3 bytes por pixel e não é mapeado sem cópia: grava como RGBX
+    mode = normalized_mode(img)
+    return 'RGBX' if mode == 'RGB' else mode
+
+class PixelCache:
+    """
+    Cache LRU limitado a `max_bytes`. A chave combina o hash do conteúdo da
+    origem com os parâmetros de redimensionamento; o uso de cada entrada é
+    marcado no mtime do arquivo, que define a ordem de remoção.
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 resized: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # False guarda a imagem decodificada em resolução original (sobrevive a mudanças de largura)
+        self.resized = resized
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._hashes = {}
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(entry.stat().st_size for entry in self._entries())
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.is_file() and entry.name.endswith(_EXTENSION)]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _EXTENSION)
+
+    def key(self, file_path, width: int = 0, variant=None):
+        """Chave da origem para a largura pedida (0: sem redimensionar) e a variante de decodificação."""
+        stat = os.stat(file_path)
+        memo = (os.fspath(file_path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(memo)
+        if digest is None:
+            digest = self._hashes[memo] = file_hash(file_path)
+        return hashlib.sha1(f"{digest}:{width if self.resized else 0}:{variant}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Devolve a imagem mapeada (somente leitura) ou None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        magic, version, width, height, mode = _HEADER.unpack_from(mapped) if len(mapped) >= _HEADER.size \
+            else (None, None, 0, 0, b'')
+        mode = mode.rstrip(b'\0').decode('ascii', 'replace')
+        if magic != _MAGIC or version != _VERSION or mode not in _MAPPED_MODES \
+                or len(mapped) != _HEADER.size + width * height * _MAPPED_MODES[mode]:
+            # Entrada truncada ou de outra versão
+            mapped.close()
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return Image.frombuffer(mode, (width, height), memoryview(mapped)[_HEADER.size:], 'raw', mode, 0, 1)
+
+    def put(self, key, img):
+        """Grava a imagem no cache; falhas de disco não interrompem o processamento."""
+        mode = img.mode if img.mode in _MAPPED_MODES else _mapped_mode(img)
+        data = (img if img.mode == mode else img.convert(mode)).tobytes()
+        size = _HEADER.size + len(data)
+        if size > self.max_bytes:
+            return False
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, img.width, img.height, mode.encode('ascii')))
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+        with self._lock:
+            self._total += size
+            over_limit = self._total > self.max_bytes
+        if over_limit:
+            self._evict()
+        return True
+
+    def _evict(self):
+        """Remove as entradas usadas há mais tempo até caber no limite."""
+        with self._lock:
+            entries = []
+            for entry in self._entries():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            # Recalcula o total: outros processos podem usar a mesma pasta
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    # No Windows, um arquivo ainda mapeado não pode ser removido
+                    continue
+                total -= size
+            self._total = total
+
+    def clear(self):
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._total = sum(entry.stat().st_size for entry in self._entries())
+
+    def summary(self):
+        return f"Cache de pixels: {self.hits} acertos, {self.misses} faltas, {self._total / (1024 * 1024):.1f} MB em uso"
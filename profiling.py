@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# A partir do Python 3.12 o cProfile usa sys.monitoring: um único perfilador
+# ativo cobre todas as threads e não é possível habilitar outro em paralelo.
+GLOBAL_PROFILER = sys.version_info >= (3, 12)
+
+# Perfilador principal ativo neste processo (desligado nos filhos criados por fork)
+_active_profiler = None
+
+def _disable_inherited_profiler():
+    global _active_profiler
+    if _active_profiler is not None:
+        _active_profiler.disable()
+        _active_profiler = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_disable_inherited_profiler)
+
+class _StatsHolder:
+    """Adapta um dicionário de estatísticas para `pstats.Stats.add`."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def _profiled_call(func, args, use_cprofile):
+    """Executa `func` no worker medindo tempo, pico do tracemalloc e, se pedido, cProfile."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    profiler = cProfile.Profile() if use_cprofile else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        if profiler:
+            profiler.disable()
+    seconds = time.perf_counter() - start
+    peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+
+    stats = None
+    if profiler:
+        profiler.create_stats()
+        stats = profiler.stats
+    return result, seconds, peak_bytes, stats
+
+class RunProfiler:
+    """
+    Coleta cProfile agregado entre threads/processos, pico do tracemalloc por
+    imagem e os arquivos mais lentos e mais pesados de uma execução.
+
+    Com threads, o pico de cada imagem inclui alocações concorrentes; o
+    tracemalloc mede apenas a heap do Python, não os buffers internos do Pillow.
+    """
+    def __init__(self, output_prefix: str, top_n: int = 10):
+        self.output_prefix = output_prefix
+        self.top_n = top_n
+        self.records = []
+        self._stats = None
+        self._lock = threading.Lock()
+        self._main_profiler = None
+        self._started_tracing = False
+        self._start_time = None
+
+    def start(self):
+        global _active_profiler
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self._start_time = time.perf_counter()
+        self._main_profiler = cProfile.Profile()
+        self._main_profiler.enable()
+        _active_profiler = self._main_profiler
+        return self
+
+    def _record(self, key, seconds, peak_bytes, stats=None):
+        with self._lock:
+            self.records.append({'file': str(key), 'seconds': seconds, 'peak_bytes': peak_bytes})
+            if stats:
+                if self._stats is None:
+                    self._stats = pstats.Stats(_StatsHolder(stats))
+                else:
+                    self._stats.add(_StatsHolder(stats))
+
+    def submit(self, executor, func, *args, key=None) -> Future:
+        """Envia a tarefa ao executor devolvendo um Future com o resultado original."""
+        # Processos sempre precisam do próprio perfilador; threads só antes do 3.12
+        use_cprofile = isinstance(executor, ProcessPoolExecutor) or not GLOBAL_PROFILER
+        inner = executor.submit(_profiled_call, func, args, use_cprofile)
+        outer = Future()
+
+        def _done(future):
+            try:
+                result, seconds, peak_bytes, stats = future.result()
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+            self._record(key, seconds, peak_bytes, stats)
+            outer.set_result(result)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    @contextmanager
+    def measure(self, key):
+        """Mede um trecho executado na própria thread da execução."""
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+            self._record(key, seconds, peak_bytes)
+
+    def stop(self):
+        """Encerra a coleta e grava o .prof e o resumo em JSON."""
+        global _active_profiler
+        self._main_profiler.disable()
+        _active_profiler = None
+        elapsed = time.perf_counter() - self._start_time
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(self._main_profiler)
+            else:
+                self._stats.add(self._main_profiler)
+            records = list(self.records)
+
+        output_dir = os.path.dirname(os.path.abspath(self.output_prefix))
+        os.makedirs(output_dir, exist_ok=True)
+        prof_path = self.output_prefix + '.prof'
+        json_path = self.output_prefix + '.json'
+        self._stats.dump_stats(prof_path)
+
+        top_functions = sorted(self._stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        summary = {
+            'elapsed_seconds': elapsed,
+            'files': len(records),
+            'slowest': sorted(records, key=lambda r: r['seconds'], reverse=True)[:self.top_n],
+            'largest': sorted(records, key=lambda r: r['peak_bytes'], reverse=True)[:self.top_n],
+            'top_functions': [
+                {
+                    'function': f"{filename}:{lineno}({funcname})",
+                    'calls': nc,
+                    'total_seconds': tt,
+                    'cumulative_seconds': ct,
+                }
+                for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in top_functions[:self.top_n]
+            ],
+            'prof_path': prof_path,
+        }
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        summary['json_path'] = json_path
+        return summary
+
+def submit(executor, profiler, func, *args, key=None):
+    """Envia a tarefa ao executor, passando pelo perfilador apenas quando ativo."""
+    if profiler is None:
+        return executor.submit(func, *args)
+    return profiler.submit(executor, func, *args, key=key)
+
+def measure(profiler, key):
+    """Contexto de medição; sem perfilador não faz nada."""
+    if profiler is None:
+        return nullcontext()
+    return profiler.measure(key)
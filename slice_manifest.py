@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# Manifesto por pasta de saída com o layout das fatias: as alturas e os hashes
+# das imagens de origem. Permite refazer apenas as fatias cujas faixas cobrem
+# imagens alteradas ou inseridas.
+
+MANIFEST_NAME = '.slices_manifest.json'
+MANIFEST_VERSION = 1
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(output_path: Path):
+    try:
+        with open(output_path / MANIFEST_NAME, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+def save_manifest(output_path: Path, settings: dict, sources: list, slice_count: int):
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'settings': settings,
+        'sources': sources,
+        'total_height': sum(source['height'] for source in sources),
+        'slice_count': slice_count,
+    }
+    temp_path = output_path / (MANIFEST_NAME + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(temp_path, output_path / MANIFEST_NAME)
+
+def remove_manifest(output_path: Path):
+    try:
+        os.remove(output_path / MANIFEST_NAME)
+    except OSError:
+        pass
+
+def source_entry(file_path: Path, previous_by_name: dict):
+    """Identifica a origem pelo hash; reaproveita o hash anterior se tamanho e mtime não mudaram."""
+    stat = os.stat(file_path)
+    previous = previous_by_name.get(file_path.name)
+    if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+        digest = previous['hash']
+    else:
+        digest = file_hash(file_path)
+    return {'name': file_path.name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+
+def slice_signatures(sources: list, slice_height: int):
+    """
+    Assinatura de cada fatia: os trechos (hash, início, fim) das origens que
+    ela cobre. Fatias com a mesma assinatura têm exatamente os mesmos pixels.
+    """
+    total_height = sum(source['height'] for source in sources)
+    signatures = []
+    index = 0
+    offset = 0
+    for top in range(0, total_height, slice_height):
+        bottom = min(top + slice_height, total_height)
+        # Avança até a primeira origem que termina depois do topo da fatia
+        while offset + sources[index]['height'] <= top:
+            offset += sources[index]['height']
+            index += 1
+        parts = []
+        current, current_offset = index, offset
+        while current < len(sources) and current_offset < bottom:
+            height = sources[current]['height']
+            parts.append((sources[current]['hash'], max(top, current_offset) - current_offset,
+                          min(bottom, current_offset + height) - current_offset))
+            current_offset += height
+            current += 1
+        signatures.append(tuple(parts))
+    return signatures